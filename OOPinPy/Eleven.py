@@ -1,45 +1,1196 @@
 """This is the main script for the 'Air Quality Analyses' tool."""
 
 
-import pgeocode
+import time
 import math
-import requests
 import json
+import threading
+import os
+import mmap
+import struct
+import bisect
+import hashlib
+import tempfile
+import datetime
+import calendar
+import random
+import re
+import codecs
+import sys
+import csv
+import argparse
+import heapq
+import importlib
+import subprocess
+from array import array
+from collections import OrderedDict
+from functools import partial, wraps
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+started_at = time.perf_counter()
+heavy_modules = ("pgeocode", "pandas", "numpy", "requests", "asyncio",
+                 "http.server", "bench")
 
 
 request_url = "https://archive-api.open-meteo.com/v1/archive"
+startup_budget = 0.3
+bench_results_path = "bench_results.jsonl"
+bench_regression_ratio = 1.25
+profile_top = 25
+profile_frames = 10
+metrics_buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+air_quality_url = "https://air-quality-api.open-meteo.com/v1/air-quality"
+zip_cache_size = 4096
+load_workers = 8
+async_concurrency = 32
+zip_index_path = os.path.join(os.path.expanduser("~"), ".cache", "pgeocode",
+                              "US-zip.idx")
+response_cache_dir = os.path.join(os.path.expanduser("~"), ".cache",
+                                  "oopinpy", "archive")
+response_cache_bytes = 512 * 1024 * 1024
+response_cache_low_water = 0.9
+response_cache_rescan = 256
+archive_delay_days = 7
+connect_timeout = 5.0
+read_timeout = 60.0
+max_retries = 4
+retry_backoff = 0.5
+max_retry_after = 30.0
+range_block_days = 64
+stream_chunk_size = 64 * 1024
+temp_variable = "temperature_2m_max"
+fetch_chunk_years = 10
+chunk_workers = 4
+workspace_budget_bytes = 256 * 1024 * 1024
+archive_batch_size = 50
+archive_batch_window = 0.05
+air_quality_limits = {"pm2_5": 35.0, "pm10": 150.0, "ozone": 140.0}
+
+
+def lazy_import(name):
+    """Import a heavy module on first use rather than at startup."""
+    return importlib.import_module(name)
+
+
+def startup_report():
+    """Return seconds since this module started and heavy modules loaded."""
+    return {"seconds": time.perf_counter() - started_at,
+            "heavy_modules": [name for name in heavy_modules
+                              if name in sys.modules]}
+
+
+def check_startup(budget=startup_budget, top=10):
+    """Time a cold `Eleven.py --help` in a fresh interpreter.
+
+    Uses -X importtime for a per-module breakdown. The check fails if
+    startup goes over budget seconds or pulls in a heavy module.
+    """
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime",
+                             os.path.abspath(__file__), "--help"],
+                            capture_output=True, text=True)
+    seconds = time.perf_counter() - started
+    imports = []
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            imports.append((int(fields[1]), fields[2].strip()))
+    imported = {name.strip() for _, name in imports}
+    heavy = [name for name in heavy_modules if name in imported]
+    return {"seconds": seconds, "budget": budget,
+            "heavy_modules": heavy,
+            "slowest_imports": [
+                {"module": name, "cumulative_us": micros}
+                for micros, name in sorted(imports, reverse=True)[:top]],
+            "ok": result.returncode == 0 and seconds <= budget and not heavy}
+
+
+class Metrics:
+    """Count and time phases such as geocode, http, decode and analytics.
+
+    Disabled by default, in which case phase() hands back a shared
+    no-op context and timed() wrappers skip straight to the function.
+    When enabled, each phase gets a call/error counter and a latency
+    histogram, and every sample is passed to any registered callbacks.
+    """
+
+    def __init__(self, buckets=metrics_buckets):
+        """Start disabled with no samples."""
+        self.enabled = False
+        self.buckets = tuple(buckets)
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._phases = {}
+        self._idle = nullcontext()
+
+    def enable(self, callback=None):
+        """Start recording, optionally forwarding samples to callback."""
+        if callback is not None:
+            self.add_callback(callback)
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording; collected samples are kept."""
+        self.enabled = False
+
+    def add_callback(self, callback):
+        """Call callback(phase, seconds, ok) for every recorded sample."""
+        self._callbacks.append(callback)
+
+    def reset(self):
+        """Forget every recorded sample."""
+        with self._lock:
+            self._phases.clear()
+
+    def phase(self, name):
+        """Return a context timing one run of a phase (no-op if off)."""
+        if not self.enabled:
+            return self._idle
+        return self._timing(name)
+
+    @contextmanager
+    def _timing(self, name):
+        """Time the with block and record it, flagging exceptions."""
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record(name, time.perf_counter() - started, ok)
+
+    def record(self, name, seconds, ok=True):
+        """Add one sample to a phase's counters and histogram."""
+        with self._lock:
+            phase = self._phases.setdefault(name, {
+                "count": 0, "errors": 0, "sum": 0.0,
+                "buckets": [0] * len(self.buckets)})
+            phase["count"] += 1
+            phase["errors"] += not ok
+            phase["sum"] += seconds
+            position = bisect.bisect_left(self.buckets, seconds)
+            if position < len(self.buckets):
+                phase["buckets"][position] += 1
+        for callback in self._callbacks:
+            callback(name, seconds, ok)
+
+    def snapshot(self):
+        """Return every phase's counters and cumulative buckets."""
+        with self._lock:
+            phases = {}
+            for name, phase in sorted(self._phases.items()):
+                running = 0
+                cumulative = {}
+                for bound, count in zip(self.buckets, phase["buckets"]):
+                    running += count
+                    cumulative[str(bound)] = running
+                cumulative["+Inf"] = phase["count"]
+                phases[name] = {"count": phase["count"],
+                                "errors": phase["errors"],
+                                "sum": phase["sum"], "buckets": cumulative}
+            return {"phases": phases}
+
+    def to_prometheus(self):
+        """Render the snapshot in the Prometheus text exposition format."""
+        lines = ["# HELP eleven_phase_seconds Time spent per phase.",
+                 "# TYPE eleven_phase_seconds histogram"]
+        phases = self.snapshot()["phases"]
+        for name, phase in phases.items():
+            for bound, count in phase["buckets"].items():
+                lines.append(f'eleven_phase_seconds_bucket{{phase="{name}",'
+                             f'le="{bound}"}} {count}')
+            lines.append(f'eleven_phase_seconds_sum{{phase="{name}"}} '
+                         f'{phase["sum"]}')
+            lines.append(f'eleven_phase_seconds_count{{phase="{name}"}} '
+                         f'{phase["count"]}')
+        lines += ["# HELP eleven_phase_errors_total Phase runs that raised.",
+                  "# TYPE eleven_phase_errors_total counter"]
+        for name, phase in phases.items():
+            lines.append(f'eleven_phase_errors_total{{phase="{name}"}} '
+                         f'{phase["errors"]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Atomically write a .prom text file or, otherwise, JSON."""
+        text = (self.to_prometheus() if path.endswith(".prom")
+                else json.dumps(self.snapshot(), indent=2))
+        directory = os.path.dirname(os.path.abspath(path))
+        handle, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(handle, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(tmp_path, path)
+        return path
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def profiling(directory, top=profile_top):
+    """Run the block under cProfile and tracemalloc, then write reports.
+
+    Writes a .pstats file (open it with pstats or snakeviz) and a text
+    report of the top allocations by line and the slowest functions.
+    cProfile only sees the calling thread, so pool workers show up as
+    the time spent waiting on them.
+    """
+    cprofile = lazy_import("cProfile")
+    pstats = lazy_import("pstats")
+    tracemalloc = lazy_import("tracemalloc")
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"eleven-{time.strftime('%Y%m%d-%H%M%S')}"
+                                   f"-{os.getpid()}")
+    tracemalloc.start(profile_frames)
+    profiler = cprofile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        profiler.dump_stats(f"{stem}.pstats")
+        with open(f"{stem}.txt", "w", encoding="utf-8") as file:
+            file.write(f"Traced memory: {current / 2 ** 20:.1f} MiB at exit, "
+                       f"{peak / 2 ** 20:.1f} MiB peak\n\n")
+            file.write(f"Top {top} allocations by line:\n")
+            for stat in snapshot.statistics("lineno")[:top]:
+                file.write(f"{stat}\n")
+            file.write(f"\nTop {top} functions by cumulative time:\n")
+            pstats.Stats(profiler, stream=file).sort_stats(
+                "cumulative").print_stats(top)
+        print(f"Profile written to {stem}.pstats and {stem}.txt",
+              file=sys.stderr)
+
+
+def timed(phase):
+    """Decorate a function so each call is timed as phase when enabled."""
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            with metrics.phase(phase):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class ZipIndex:
+    """Memory-map a compact zip -> (lat, lon, place_name) index file.
+
+    Layout after the header: sorted int32 zip keys, float32 latitudes,
+    float32 longitudes, uint32 place name ids, uint32 name offsets and
+    the utf-8 name table, so no pandas is needed to answer a lookup.
+    """
+
+    _magic = b"ZIPIDX1\0"
+    _header = struct.Struct("<8sIII")
+
+    def __init__(self, path=zip_index_path):
+        """Open the index read-only and slice its columns as memoryviews."""
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, name_count, name_bytes = (
+            self._header.unpack_from(self._map))
+        if magic != self._magic:
+            raise ValueError(f"{path} is not a zip index file")
+        view = memoryview(self._map)
+        offset = self._header.size
+        columns = []
+        for code, length in (("i", count), ("f", count), ("f", count),
+                             ("I", count), ("I", name_count + 1)):
+            columns.append(view[offset:offset + 4 * length].cast(code))
+            offset += 4 * length
+        (self._keys, self._lats, self._lons, self._name_ids,
+         self._name_offsets) = columns
+        self._names = view[offset:offset + name_bytes]
+
+    def __len__(self):
+        """Return the number of zip codes in the index."""
+        return len(self._keys)
+
+    def lookup(self, zip_code):
+        """Binary search zip, returning NaNs like pgeocode when missing.
+
+        Only five-digit codes are looked up, since int keys would let
+        "1001" or "001001" match 01001.
+        """
+        key = str(zip_code).strip()
+        if len(key) == 5 and key.isascii() and key.isdigit():
+            pos = bisect.bisect_left(self._keys, int(key))
+            if pos < len(self._keys) and self._keys[pos] == int(key):
+                name_id = self._name_ids[pos]
+                start, stop = self._name_offsets[name_id:name_id + 2]
+                return (float(self._lats[pos]), float(self._lons[pos]),
+                        bytes(self._names[start:stop]).decode("utf-8"))
+        return math.nan, math.nan, math.nan
+
+    @classmethod
+    def build(cls, path=zip_index_path, geocoder=None):
+        """Compile the pgeocode US table into an index file at path."""
+        if geocoder is None:
+            geocoder = lazy_import("pgeocode").Nominatim('us')
+        table = geocoder._data_frame.dropna(subset=["latitude", "longitude"])
+        rows = sorted((int(code), lat, lon, name) for code, lat, lon, name
+                      in zip(table["postal_code"], table["latitude"],
+                             table["longitude"], table["place_name"])
+                      if str(code).isdigit())
+        name_ids = {}
+        for row in rows:
+            name_ids.setdefault(str(row[3]), len(name_ids))
+        names = [name.encode("utf-8") for name in name_ids]
+        offsets = array("I", [0])
+        for name in names:
+            offsets.append(offsets[-1] + len(name))
+        name_table = b"".join(names)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(cls._header.pack(cls._magic, len(rows), len(names),
+                                        len(name_table)))
+            file.write(array("i", [row[0] for row in rows]).tobytes())
+            file.write(array("f", [row[1] for row in rows]).tobytes())
+            file.write(array("f", [row[2] for row in rows]).tobytes())
+            file.write(array("I", [name_ids[str(row[3])]
+                                   for row in rows]).tobytes())
+            file.write(offsets.tobytes())
+            file.write(name_table)
+        os.replace(tmp_path, path)
+        return path
+
+
+class ResponseCache:
+    """Keep archive responses on disk, evicting least recently used.
+
+    Each response lives in its own file named after a hash of the
+    request key. Reads bump the file's mtime, so mtime order is LRU
+    order, and writes go through a temp file plus os.replace so
+    concurrent processes never see a partial entry.
+
+    Writes keep a running byte total instead of listing the directory
+    each time. The total is rescanned every rescan_every writes to pick
+    up other processes, and once it passes max_bytes the oldest entries
+    are evicted down to low_water of the limit.
+    """
+
+    def __init__(self, directory=response_cache_dir,
+                 max_bytes=response_cache_bytes,
+                 low_water=response_cache_low_water,
+                 rescan_every=response_cache_rescan):
+        """Remember where entries live; the directory is made on write."""
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.rescan_every = rescan_every
+        self.hits = 0
+        self.misses = 0
+        self._bytes = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(parameters):
+        """Return the request key: location, range, variables, timezone."""
+        return json.dumps([round(float(parameters["latitude"]), 4),
+                           round(float(parameters["longitude"]), 4),
+                           parameters["start_date"], parameters["end_date"],
+                           parameters.get("daily", parameters.get("hourly")),
+                           parameters["timezone"]])
+
+    @staticmethod
+    def cacheable(parameters):
+        """Only cache windows that the archive will never revise."""
+        try:
+            end = datetime.date.fromisoformat(parameters["end_date"])
+        except ValueError:
+            return False
+        cutoff = datetime.date.today() - datetime.timedelta(
+            days=archive_delay_days)
+        return end < cutoff
+
+    def _path(self, parameters):
+        """Return the entry file for a set of request parameters."""
+        digest = hashlib.sha256(self.key(parameters).encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, parameters):
+        """Return the cached response text, or None on a miss."""
+        path = self._path(parameters)
+        try:
+            with open(path, encoding="utf-8") as file:
+                text = file.read()
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return text
+
+    def open_entry(self, parameters):
+        """Return the cached response as a binary file, or None."""
+        path = self._path(parameters)
+        try:
+            file = open(path, "rb")
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return file
+
+    def tee(self, parameters, chunks):
+        """Yield chunks through while writing them to a new entry."""
+        if not self.cacheable(parameters):
+            yield from chunks
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=self.directory,
+                                            suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as file:
+                for chunk in chunks:
+                    file.write(chunk)
+                    yield chunk
+            self._commit(tmp_path, self._path(parameters))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put(self, parameters, text):
+        """Atomically store a response, then evict if over max_bytes."""
+        if not self.cacheable(parameters):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=self.directory,
+                                            suffix=".tmp")
+        try:
+            with os.fdopen(handle, "w", encoding="utf-8") as file:
+                file.write(text)
+            self._commit(tmp_path, self._path(parameters))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _commit(self, tmp_path, path):
+        """Move a finished temp file into place and update the total."""
+        size = os.path.getsize(tmp_path)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._writes += 1
+            if self._bytes is None or self._writes >= self.rescan_every:
+                self._bytes = None
+            else:
+                self._bytes += size - replaced
+            over = self._bytes is None or self._bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def discard(self, parameters):
+        """Delete one entry, e.g. after it turned out to be unreadable."""
+        try:
+            os.remove(self._path(parameters))
+        except OSError:
+            pass
+        with self._lock:
+            self._bytes = None
+
+    def entries(self):
+        """Return (path, size, mtime) for each entry, oldest first."""
+        found = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return found
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            try:
+                info = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            found.append((os.path.join(self.directory, name), info.st_size,
+                          info.st_mtime))
+        return sorted(found, key=lambda entry: entry[2])
+
+    def evict(self):
+        """Rescan the total and, if over max_bytes, drop the oldest."""
+        entries = self.entries()
+        total = sum(entry[1] for entry in entries)
+        if total > self.max_bytes:
+            target = self.max_bytes * self.low_water
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        with self._lock:
+            self._bytes = total
+            self._writes = 0
+
+    def purge(self):
+        """Delete every entry and return how many were removed."""
+        entries = self.entries()
+        for path, _, _ in entries:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._bytes = 0
+            self._writes = 0
+        return len(entries)
+
+    def stats(self):
+        """Return hit/miss counters plus entry count and total bytes."""
+        entries = self.entries()
+        return {"hits": self.hits, "misses": self.misses,
+                "entries": len(entries),
+                "bytes": sum(entry[1] for entry in entries),
+                "max_bytes": self.max_bytes}
+
+
+response_cache = ResponseCache()
+air_quality_cache = ResponseCache(os.path.join(response_cache_dir,
+                                               "air-quality"))
+
+
+def set_response_cache(cache):
+    """Swap the archive response cache, returning the old one."""
+    global response_cache
+    previous, response_cache = response_cache, cache
+    return previous
+
+
+class DailyColumnsDecoder:
+    """Decode the "daily" (or "hourly") block of a response chunk by chunk.
+
+    Only the structure around the arrays is tokenized. The time and
+    value arrays are read in bulk straight into float arrays, and the
+    dates are only counted, so memory does not grow with the raw body.
+    Multi-location bodies (a list of objects) give one entry per
+    location in locations.
+    """
+
+    _token = re.compile(r'\s*(?:"((?:[^"\\]|\\.)*)"|([{}\[\]:,])'
+                        r'|([^\s{}\[\]:,"]+))')
+
+    def __init__(self, variables, block="daily"):
+        """Prepare an empty float column for each requested variable."""
+        self.variables = tuple(variables)
+        self.locations = []
+        self._block = block
+        self._start_location()
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._stack = []
+        self._bulk = None
+        self._seen_block = False
+
+    def _start_location(self):
+        """Reset the columns for the next location in the body."""
+        self.columns = {variable: array("d") for variable in self.variables}
+        self.first_time = None
+        self.time_count = 0
+
+    def _finish_location(self):
+        """Record (first day ordinal, columns) for the location just read.
+
+        Days are derived from position, so every column must have one
+        value per date or the whole date axis would shift.
+        """
+        for variable, values in self.columns.items():
+            if len(values) != self.time_count:
+                raise ValueError(f"archive response has {self.time_count} "
+                                 f"dates but {len(values)} {variable} "
+                                 f"values")
+        first_day = (None if self.first_time is None
+                     else date_to_ordinal(self.first_time[:10]))
+        self.locations.append((first_day, self.columns))
+        self._start_location()
+
+    def feed(self, chunk):
+        """Consume the next bytes of the response body."""
+        self._buffer += self._text.decode(chunk)
+        self._parse(final=False)
+
+    def close(self):
+        """Finish decoding and return (first day ordinal, columns)."""
+        self._buffer += self._text.decode(b"", final=True)
+        self._parse(final=True)
+        if not self._seen_block:
+            raise KeyError(self._block)
+        return self.locations[0]
+
+    def _in_location(self, depth):
+        """Tell whether stack[:depth] is one location's top-level object."""
+        return (depth == 1 and self._stack[0][0] == "{") or (
+            depth == 2 and self._stack[0][0] == "["
+            and self._stack[1][0] == "{")
+
+    def _in_block(self):
+        """Tell whether the innermost open object is the wanted block."""
+        return (len(self._stack) >= 2 and self._stack[-1][0] == "{"
+                and self._stack[-2][1] == self._block
+                and self._in_location(len(self._stack) - 1))
+
+    def _take(self, text):
+        """Append one comma-separated run of the current bulk array."""
+        if self._bulk == "time":
+            if self.first_time is None and '"' in text:
+                self.first_time = text.split('"', 2)[1]
+            self.time_count += text.count('"') // 2
+            return
+        column = self.columns[self._bulk]
+        for item in text.split(","):
+            item = item.strip()
+            if item:
+                column.append(math.nan if item == "null" else float(item))
+
+    def _parse(self, final):
+        """Walk the buffered text, keeping any incomplete tail."""
+        buffer = self._buffer
+        pos = 0
+        while pos < len(buffer):
+            if self._bulk is not None:
+                end = buffer.find("]", pos)
+                if end < 0:
+                    cut = buffer.rfind(",", pos)
+                    if cut < 0:
+                        break
+                    self._take(buffer[pos:cut])
+                    pos = cut + 1
+                    continue
+                self._take(buffer[pos:end])
+                self._bulk = None
+                pos = end + 1
+                continue
+            match = self._token.match(buffer, pos)
+            if match is None:
+                if final and buffer[pos:].strip():
+                    raise ValueError("archive response is not valid JSON")
+                break
+            if match.group(3) and match.end() == len(buffer) and not final:
+                break
+            pos = match.end()
+            punctuation = match.group(2)
+            if match.group(1) is not None:
+                if self._stack and self._stack[-1][0] == "{" and (
+                        self._stack[-1][2]):
+                    self._stack[-1][1] = match.group(1)
+            elif punctuation == "{":
+                if self._stack and self._stack[-1][1] == self._block and (
+                        self._in_location(len(self._stack))):
+                    self._seen_block = True
+                self._stack.append(["{", None, True])
+            elif punctuation == "[":
+                if self._in_block() and (self._stack[-1][1] == "time"
+                                         or self._stack[-1][1]
+                                         in self.columns):
+                    self._bulk = self._stack[-1][1]
+                else:
+                    self._stack.append(["[", None, False])
+            elif punctuation in ("}", "]"):
+                self._stack.pop()
+                if punctuation == "}" and (
+                        not self._stack or (len(self._stack) == 1
+                                            and self._stack[0][0] == "[")):
+                    self._finish_location()
+            elif punctuation == ":":
+                self._stack[-1][2] = False
+            elif punctuation == "," and self._stack[-1][0] == "{":
+                self._stack[-1][2] = True
+        self._buffer = buffer[pos:]
+
+
+class ArchiveClient:
+    """Pooled keep-alive HTTP client for the open-meteo archive.
+
+    Requests time out instead of hanging, and 429/5xx answers or
+    dropped connections are retried with jittered exponential backoff.
+    A Retry-After longer than max_retry_after is not honoured.
+    Pass a different url or session to point it at a stand-in server.
+    """
+
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, url=request_url, session=None, pool_size=16,
+                 timeout=(connect_timeout, read_timeout),
+                 retries=max_retries, backoff=retry_backoff, gzip=True,
+                 max_retry_after=max_retry_after):
+        """Keep the retry policy; the session is built on first use."""
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
+        self._pool_size = pool_size
+        self._gzip = gzip
+        self._session = session
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """Return the pooled session, importing requests only now."""
+        with self._lock:
+            if self._session is None:
+                requests = lazy_import("requests")
+                self._session = requests.Session()
+                adapter = lazy_import("requests.adapters").HTTPAdapter(
+                    pool_connections=self._pool_size,
+                    pool_maxsize=self._pool_size)
+                self._session.mount("http://", adapter)
+                self._session.mount("https://", adapter)
+            self._session.headers["Accept-Encoding"] = (
+                "gzip" if self._gzip else "identity")
+            return self._session
+
+    def _delay(self, attempt, response=None):
+        """Return how long to sleep before the next attempt."""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if (retry_after.isdigit()
+                    and float(retry_after) <= self.max_retry_after):
+                return float(retry_after)
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    @timed("http")
+    def get(self, parameters, stream=False):
+        """GET the archive, retrying transient failures."""
+        session = self.session
+        requests = lazy_import("requests")
+        for attempt in range(self.retries + 1):
+            last_try = attempt == self.retries
+            try:
+                response = session.get(self.url, params=parameters,
+                                       timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_try:
+                    raise
+                time.sleep(self._delay(attempt))
+                continue
+            if response.status_code not in self.retry_statuses or last_try:
+                return response
+            response.close()
+            time.sleep(self._delay(attempt, response))
+
+    def close(self):
+        """Close pooled connections, if any were opened."""
+        if self._session is not None:
+            self._session.close()
+
+
+archive_client = ArchiveClient()
+air_quality_client = ArchiveClient(air_quality_url)
+
+
+def set_archive_client(client):
+    """Swap the client used by every dataset, returning the old one."""
+    global archive_client
+    previous, archive_client = archive_client, client
+    return previous
+
+
+class ArchiveBatcher:
+    """Merge concurrent archive requests into multi-location calls.
+
+    Requests that share a date range, variables and timezone wait up to
+    window seconds for company, then go out as one call with
+    comma-separated coordinates (at most batch_size of them). The
+    response is split back per location and cached per location.
+    """
+
+    def __init__(self, client=None, batch_size=archive_batch_size,
+                 window=archive_batch_window):
+        """Use the given client, or the module's archive_client."""
+        self.client = client
+        self.batch_size = batch_size
+        self.window = window
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def fetch(self, parameters):
+        """Return (first day, columns) for one location's request."""
+        group = (parameters["start_date"], parameters["end_date"],
+                 parameters["daily"], parameters["timezone"])
+        item = {"parameters": parameters, "done": threading.Event()}
+        flush = None
+        with self._lock:
+            batch = self._pending.setdefault(group, [])
+            batch.append(item)
+            leader = len(batch) == 1
+            if len(batch) >= self.batch_size:
+                del self._pending[group]
+                flush = batch
+        if flush is None and leader:
+            time.sleep(self.window)
+            with self._lock:
+                if self._pending.get(group) is batch:
+                    del self._pending[group]
+                    flush = batch
+        if flush is not None:
+            self.send(flush)
+        item["done"].wait()
+        if "error" in item:
+            raise item["error"]
+        return item["result"]
+
+    def send(self, batch):
+        """Make one call for a batch and hand each item its location."""
+        parameters = dict(batch[0]["parameters"])
+        parameters["latitude"] = ",".join(
+            str(item["parameters"]["latitude"]) for item in batch)
+        parameters["longitude"] = ",".join(
+            str(item["parameters"]["longitude"]) for item in batch)
+        decoder = DailyColumnsDecoder(parameters["daily"].split(","))
+        client = self.client or archive_client
+        try:
+            self.calls += 1
+            with client.get(parameters, stream=True) as response, (
+                    metrics.phase("decode")):
+                for chunk in response.iter_content(stream_chunk_size):
+                    decoder.feed(chunk)
+                decoder.close()
+            if len(decoder.locations) != len(batch):
+                raise LookupError("archive returned the wrong number of "
+                                  "locations")
+            for item, (first_day, columns) in zip(batch, decoder.locations):
+                item["result"] = first_day, columns
+                if first_day is not None:
+                    response_cache.put(item["parameters"], json.dumps(
+                        {"daily": columns_to_daily(first_day, columns)}))
+        except (LookupError, ValueError,
+                lazy_import("requests").RequestException) as error:
+            for item in batch:
+                item["error"] = LookupError(
+                    f"archive batch request failed: {error}")
+        finally:
+            for item in batch:
+                item["done"].set()
+
+
+def columns_to_daily(first_day, columns):
+    """Rebuild an archive "daily" block from a first day and columns."""
+    count = len(next(iter(columns.values()), ()))
+    daily = {"time": [ordinal_to_date(first_day + position)
+                      for position in range(count)]}
+    for variable, values in columns.items():
+        daily[variable] = [None if math.isnan(value) else value
+                           for value in values]
+    return daily
+
+
+archive_batcher = None
+
+
+def set_archive_batcher(batcher):
+    """Route uncached archive calls through a batcher (None to stop)."""
+    global archive_batcher
+    previous, archive_batcher = archive_batcher, batcher
+    return previous
+
+
+def set_air_quality_cache(cache):
+    """Swap the air quality response cache, returning the old one."""
+    global air_quality_cache
+    previous, air_quality_cache = air_quality_cache, cache
+    return previous
+
+
+def set_air_quality_client(client):
+    """Swap the client used by air quality datasets, returning the old one."""
+    global air_quality_client
+    previous, air_quality_client = air_quality_client, client
+    return previous
+
+
+def build_zip_index(path=zip_index_path):
+    """Build the compact zip index and point the lookup cache at it."""
+    ZipIndex.build(path, zip_lookup_cache.geocoder())
+    zip_lookup_cache.use_index(path)
+    return path
+
+
+class ZipLookupCache:
+    """Share one geocoder and keep a bounded LRU of zip lookups."""
+
+    def __init__(self, max_size=zip_cache_size, index_path=zip_index_path):
+        """Start empty; the index and geocoder are only opened on use."""
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._geocoder = None
+        self._index_path = index_path
+        self._index = None
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def geocoder(self):
+        """Build the US geocoder once per process, then reuse it."""
+        with self._lock:
+            if self._geocoder is None:
+                self._geocoder = lazy_import("pgeocode").Nominatim('us')
+            return self._geocoder
+
+    def index(self):
+        """Open the compact zip index if one has been built, else None."""
+        with self._lock:
+            if self._index is None and self._index_path is not None:
+                if os.path.exists(self._index_path):
+                    self._index = ZipIndex(self._index_path)
+                else:
+                    self._index_path = None
+            return self._index
+
+    def use_index(self, path):
+        """Switch lookups to the index at path (None disables it)."""
+        with self._lock:
+            self._index_path = path
+            self._index = None
+
+    def lookup(self, zip_code):
+        """Return (lat, lon, place_name) for zip, querying only on a miss."""
+        key = str(zip_code).strip()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        index = self.index()
+        if index is not None:
+            loc_info = index.lookup(key)
+        else:
+            result = self.geocoder().query_postal_code(key)
+            loc_info = (result['latitude'], result['longitude'],
+                        result['place_name'])
+        self.store(key, loc_info)
+        return loc_info
+
+    @timed("geocode_batch")
+    def lookup_many(self, zip_codes):
+        """Return {zip: loc_info}, geocoding all misses in one query."""
+        found = {}
+        missing = []
+        with self._lock:
+            for zip_code in zip_codes:
+                key = str(zip_code).strip()
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    found[key] = self._entries[key]
+                elif key not in missing:
+                    self.misses += 1
+                    missing.append(key)
+        index = self.index()
+        if index is not None:
+            results = [index.lookup(key) for key in missing]
+        elif missing:
+            frame = self.geocoder().query_postal_code(missing)
+            results = list(zip(frame['latitude'], frame['longitude'],
+                               frame['place_name']))
+        else:
+            results = []
+        for key, loc_info in zip(missing, results):
+            self.store(key, loc_info)
+            found[key] = loc_info
+        return found
+
+    def store(self, zip_code, loc_info):
+        """Insert a lookup result, evicting the least recently used one."""
+        key = str(zip_code).strip()
+        with self._lock:
+            self._entries[key] = loc_info
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop cached lookups and reset the hit/miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters and current size as a dict."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self._entries), "max_size": self._max_size}
+
+
+zip_lookup_cache = ZipLookupCache()
+
+
+def date_to_ordinal(date_str):
+    """Turn YYYY-MM-DD into a day number, raising LookupError if bad."""
+    try:
+        return datetime.date.fromisoformat(str(date_str)).toordinal()
+    except ValueError:
+        raise LookupError(f"{date_str} is not a YYYY-MM-DD date")
+
+
+def ordinal_to_date(ordinal):
+    """Turn a day number back into a YYYY-MM-DD string."""
+    return datetime.date.fromordinal(ordinal).isoformat()
+
+
+class DaySegments:
+    """Hold loaded days for one location as sorted, non-touching runs.
+
+    Each segment is [first_ordinal, values], so a window change only
+    has to fetch the days no segment covers yet.
+    """
+
+    def __init__(self):
+        """Start with nothing loaded."""
+        self._segments = []
+
+    def missing(self, first, last):
+        """Return (first, last) day ranges inside the window not loaded."""
+        gaps = []
+        cursor = first
+        for seg_first, values in self._segments:
+            seg_last = seg_first + len(values) - 1
+            if seg_last < cursor:
+                continue
+            if seg_first > last:
+                break
+            if seg_first > cursor:
+                gaps.append((cursor, seg_first - 1))
+            cursor = seg_last + 1
+        if cursor <= last:
+            gaps.append((cursor, last))
+        return gaps
+
+    def add(self, first, values):
+        """Merge a run of daily values starting at day first."""
+        last = first + len(values) - 1
+        merged_first, merged = first, array("d", values)
+        kept = []
+        for seg_first, seg_values in self._segments:
+            seg_last = seg_first + len(seg_values) - 1
+            if seg_last + 1 < merged_first or seg_first > last + 1:
+                kept.append([seg_first, seg_values])
+                continue
+            if seg_first < merged_first:
+                merged = seg_values[:merged_first - seg_first] + merged
+                merged_first = seg_first
+            if seg_last > last:
+                merged = merged + seg_values[last + 1 - seg_first:]
+                last = seg_last
+        kept.append([merged_first, merged])
+        self._segments = sorted(kept, key=lambda segment: segment[0])
+
+    def slice(self, first, last):
+        """Return the window's values, NaN where unloaded.
+
+        A window inside one segment comes back as a read-only memoryview
+        of it, so the series is not held twice; otherwise a new array.
+        """
+        for seg_first, seg_values in self._segments:
+            if seg_first <= first and last < seg_first + len(seg_values):
+                return memoryview(seg_values).toreadonly()[
+                    first - seg_first:last - seg_first + 1]
+        values = array("d", [math.nan]) * (last - first + 1)
+        for seg_first, seg_values in self._segments:
+            lo = max(first, seg_first)
+            hi = min(last, seg_first + len(seg_values) - 1)
+            if lo <= hi:
+                values[lo - first:hi - first + 1] = (
+                    seg_values[lo - seg_first:hi - seg_first + 1])
+        return values
 
 
 class HistoricalTemps:
     """Create class with Historical Temperatures."""
 
-    def __init__(self, zip_code: str, start="1950-08-13", end="2023-08-25"):
-        """Use 3 parameters in init method, return tuple, and validate lat."""
+    _range_kinds = {"min": (min, math.inf), "max": (max, -math.inf)}
+
+    def __init__(self, zip_code: str, start="1950-08-13", end="2023-08-25",
+                 variables=()):
+        """Use 3 parameters in init method, return tuple, and validate lat.
+
+        Extra daily variables (e.g. precipitation_sum) are fetched in the
+        same archive call as the max temperature and kept as aligned
+        columns. on_grow, if set, is called whenever the dataset takes
+        more memory: a released series loading again or an index being
+        built.
+        """
         self._zip_code = zip_code
         self._start = start
         self._end = end
+        self._variables = tuple(dict.fromkeys((temp_variable,)
+                                              + tuple(variables)))
         self._lat, self._lon, self._loc_name = (
             HistoricalTemps.zip_to_loc_info(zip_code))
-        self._temp_list = None
+        self._first_day = None
+        self._columns = {variable: array("d") for variable in self._variables}
+        self._sorted_index = None
+        self._aggregates = None
+        self._segments = {variable: DaySegments()
+                          for variable in self._variables}
+        self.on_grow = None
         self._load_temps()
 
     @staticmethod
-    def _convert_json_to_list(data):
-        """Convert open-meteo json string to dict, then print dates/temps."""
-        data_dict = json.loads(data)
-        return list(zip(data_dict["daily"]["time"],
-                        data_dict["daily"]["temperature_2m_max"]))
+    @timed("decode")
+    def _convert_json_to_columns(chunks, variables=(temp_variable,)):
+        """Stream open-meteo json bytes into (first day, columns dict)."""
+        if isinstance(chunks, str):
+            chunks = [chunks.encode("utf-8")]
+        decoder = DailyColumnsDecoder(variables)
+        for chunk in chunks:
+            decoder.feed(chunk)
+        return decoder.close()
+
+    def _day(self, position):
+        """Return the date string for a position in the loaded window."""
+        return ordinal_to_date(self._first_day + position)
+
+    @classmethod
+    def from_zip_codes(cls, zip_codes, start="1950-08-13", end="2023-08-25",
+                       max_workers=load_workers, variables=()):
+        """Geocode zips in one query, load them concurrently.
+
+        Returns (datasets, errors), both keyed by zip code, so one bad
+        zip is reported in errors instead of aborting the whole batch.
+        """
+        zip_codes = [str(zip_code).strip() for zip_code in zip_codes]
+        zip_lookup_cache.lookup_many(zip_codes)
+        datasets = {}
+        errors = {}
+
+        def load(zip_code):
+            try:
+                datasets[zip_code] = cls(zip_code, start, end, variables)
+            except Exception as error:
+                errors[zip_code] = f"{type(error).__name__}: {error}"
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(load, dict.fromkeys(zip_codes)))
+        return datasets, errors
 
     @staticmethod
+    @timed("geocode")
     def zip_to_loc_info(zip_code):
         """Use static method by passing zip to return location details."""
-        geocoder = pgeocode.Nominatim('us')
-        result = geocoder.query_postal_code(zip_code)
-        lat = result['latitude']
-        lon = result['longitude']
-        loc_name = result['place_name']
+        lat, lon, loc_name = zip_lookup_cache.lookup(zip_code)
         if math.isnan(lat):
-            raise LookupError
+            raise LookupError(f"zip code {zip_code} could not be found")
         return lat, lon, loc_name
 
     @property
@@ -74,6 +1225,20 @@ class HistoricalTemps:
             self._end = initial_end
             raise LookupError
 
+    def set_range(self, start, end):
+        """Validate both dates, load once, then swap the window in.
+
+        Any failure puts the old window back, so the dates always match
+        the loaded series.
+        """
+        initial_start, initial_end = self._start, self._end
+        self._start, self._end = start, end
+        try:
+            self._load_temps()
+        except Exception:
+            self._start, self._end = initial_start, initial_end
+            raise
+
     @property
     def zip_code(self):
         """Run zip_code getter here."""
@@ -84,30 +1249,728 @@ class HistoricalTemps:
         """Run loc_name getter here."""
         return self._loc_name
 
+    @timed("load")
     def _load_temps(self):
-        """Call open-meteo API // maintain hardcoded historical temp data."""
+        """Fetch only the days not loaded yet, then slice the window."""
+        first = date_to_ordinal(self._start)
+        last = date_to_ordinal(self._end)
+        if first > last:
+            raise LookupError(f"{self._start} is after {self._end}")
+        chunks = [chunk for gap in
+                  self._segments[temp_variable].missing(first, last)
+                  for chunk in self._chunk_ranges(*gap)]
+        for day, columns in self._fetch_chunks(chunks):
+            if day is not None:
+                for variable, values in columns.items():
+                    self._segments[variable].add(day, values)
+        self._columns = {variable: segments.slice(first, last)
+                         for variable, segments in self._segments.items()}
+        self._first_day = first
+        self._sorted_index = None
+        self._aggregates = None
+
+    @staticmethod
+    def _chunk_ranges(first, last):
+        """Split days into chunks that break on calendar-aligned years.
+
+        Chunks break on January 1st of years divisible by
+        fetch_chunk_years, so whole blocks inside any window are the same
+        requests (and cache keys) for every window. The ends are clipped
+        to the requested days rather than widened, so a short window
+        only fetches and keeps its own days.
+        """
+        chunks = []
+        year = datetime.date.fromordinal(first).year
+        while first <= last:
+            year += fetch_chunk_years - year % fetch_chunk_years
+            boundary = (datetime.date(year, 1, 1).toordinal()
+                        if year <= datetime.MAXYEAR else last + 1)
+            chunks.append((first, min(boundary - 1, last)))
+            first = boundary
+        return chunks
+
+    def _fetch_chunk(self, chunk):
+        """Fetch one chunk; retries are left to the archive client."""
+        return self._fetch_days(ordinal_to_date(chunk[0]),
+                                ordinal_to_date(chunk[1]))
+
+    def _fetch_chunks(self, chunks):
+        """Fetch chunks on a bounded thread pool, returned in order."""
+        if len(chunks) <= 1:
+            return [self._fetch_chunk(chunk) for chunk in chunks]
+        with ThreadPoolExecutor(max_workers=chunk_workers) as pool:
+            return list(pool.map(self._fetch_chunk, chunks))
+
+    def _fetch_days(self, start, end):
+        """Call open-meteo API for one range, going through the cache."""
         parameters = {"latitude": self._lat,
                       "longitude": self._lon,
-                      "start_date": self._start,
-                      "end_date": self._end,
-                      "daily": "temperature_2m_max",
+                      "start_date": start,
+                      "end_date": end,
+                      "daily": ",".join(self._variables),
                       "timezone": "America/Los_Angeles"
                       }
-        data = requests.get(request_url, params=parameters)
-        self._temp_list = self._convert_json_to_list(data.text)
+        entry = response_cache.open_entry(parameters)
+        if entry is not None:
+            try:
+                with entry:
+                    return self._convert_json_to_columns(
+                        iter(lambda: entry.read(stream_chunk_size), b""),
+                        self._variables)
+            except ValueError:
+                response_cache.discard(parameters)
+        if archive_batcher is not None:
+            return archive_batcher.fetch(parameters)
+        try:
+            with archive_client.get(parameters, stream=True) as response:
+                chunks = response.iter_content(stream_chunk_size)
+                if response.status_code == 200:
+                    chunks = response_cache.tee(parameters, chunks)
+                return self._convert_json_to_columns(chunks,
+                                                     self._variables)
+        except lazy_import("requests").RequestException as error:
+            raise LookupError(f"archive request failed: {error}")
+        except ValueError as error:
+            response_cache.discard(parameters)
+            raise LookupError(f"archive response could not be read: {error}")
+
+    @property
+    def _temps(self):
+        """Return the max temperature column, reloading it if released."""
+        if self._columns is None:
+            self._reload()
+        return self._columns[temp_variable]
+
+    def _reload(self):
+        """Load a released series again, then report the growth."""
+        self._load_temps()
+        self._grew()
+
+    def _grew(self):
+        """Tell on_grow that this dataset now holds more memory."""
+        if self.on_grow is not None:
+            self.on_grow()
+
+    @property
+    def is_loaded(self):
+        """Tell whether the series is in memory rather than released."""
+        return self._columns is not None
+
+    def release_series(self):
+        """Drop series data but keep metadata; it reloads on next use."""
+        self._columns = None
+        self._sorted_index = None
+        self._aggregates = None
+        self._segments = {variable: DaySegments()
+                          for variable in self._variables}
+
+    def memory_bytes(self):
+        """Return the bytes held by series columns, indexes and segments.
+
+        Columns that are views of a segment are counted with the segment.
+        """
+        held = []
+        if self._columns is not None:
+            held.extend(values for values in self._columns.values()
+                        if not isinstance(values, memoryview))
+        for segments in self._segments.values():
+            held.extend(values for _, values in segments._segments)
+        if self._sorted_index is not None:
+            held.extend(self._sorted_index)
+        if self._aggregates is not None:
+            held.extend((self._aggregates["sums"],
+                         self._aggregates["counts"]))
+            for kind in ("min", "max"):
+                held.extend(self._aggregates[kind] or [])
+        return sum(sys.getsizeof(values) for values in held)
+
+    @property
+    def variables(self):
+        """Run variables getter here."""
+        return self._variables
+
+    def column(self, variable):
+        """Return a copy of one daily variable's values for the window."""
+        if variable not in self._variables:
+            raise LookupError(f"{variable} was not loaded for this dataset")
+        if self._columns is None:
+            self._reload()
+        return array("d", self._columns[variable])
+
+    def daily_values(self, variable=temp_variable):
+        """Return (date, value) tuples for one daily variable."""
+        return [(self._day(position), value)
+                for position, value in enumerate(self.column(variable))]
+
+    def _window(self, start=None, end=None):
+        """Turn optional start/end dates into clamped [lo, hi) positions."""
+        lo = 0 if start is None else date_to_ordinal(start) - self._first_day
+        hi = (len(self._temps) if end is None
+              else date_to_ordinal(end) - self._first_day + 1)
+        lo = min(max(lo, 0), len(self._temps))
+        return lo, max(min(hi, len(self._temps)), lo)
+
+    def _prefix(self):
+        """Build NaN-aware prefix sums/counts; min/max come on demand."""
+        if self._aggregates is None:
+            sums = array("d", [0.0])
+            counts = array("l", [0])
+            for temp in self._temps:
+                valid = not math.isnan(temp)
+                sums.append(sums[-1] + temp if valid else sums[-1])
+                counts.append(counts[-1] + valid)
+            self._aggregates = {"sums": sums, "counts": counts,
+                                "min": None, "max": None}
+            self._grew()
+        return self._aggregates
+
+    def _blocks(self, kind):
+        """Build per-block min or max and a sparse table over the blocks.
+
+        Each run of range_block_days readings is reduced to one value,
+        so the table stays a small fraction of the series' size.
+        """
+        aggregates = self._prefix()
+        if aggregates[kind] is None:
+            pick = self._range_kinds[kind][0]
+            levels = [array("d", [
+                self._scan(kind, lo, lo + range_block_days)
+                for lo in range(0, len(self._temps), range_block_days)])]
+            width = 1
+            while width * 2 <= len(levels[0]):
+                prev = levels[-1]
+                levels.append(array("d", map(pick, prev[:len(prev) - width],
+                                             prev[width:])))
+                width *= 2
+            aggregates[kind] = levels
+            self._grew()
+        return aggregates[kind]
+
+    def _scan(self, kind, lo, hi):
+        """Return the min or max reading in [lo, hi), or +/-inf if none."""
+        pick, fill = self._range_kinds[kind]
+        return pick((temp for temp in self._temps[lo:hi]
+                     if not math.isnan(temp)), default=fill)
+
+    @timed("sum_temp")
+    def sum_temp(self, start=None, end=None):
+        """Sum readings between optional dates in O(1)."""
+        lo, hi = self._window(start, end)
+        sums = self._prefix()["sums"]
+        return sums[hi] - sums[lo]
+
+    @timed("average_temp")
+    def average_temp(self, start=None, end=None):
+        """Compute average temp in O(1), skipping days with no reading."""
+        lo, hi = self._window(start, end)
+        aggregates = self._prefix()
+        days = aggregates["counts"][hi] - aggregates["counts"][lo]
+        if not days:
+            return math.nan
+        return (aggregates["sums"][hi] - aggregates["sums"][lo]) / days
+
+    def _range_pick(self, kind, start, end):
+        """Answer a min or max query from the block table plus the ends.
 
-    def average_temp(self):
-        """Compute average temp, then print."""
-        return sum(item[1] for item in self._temp_list) / len(self._temp_list)
+        Whole blocks come from two overlapping table rows; the partial
+        blocks at either end are scanned, so at most 2 * block days.
+        """
+        lo, hi = self._window(start, end)
+        if lo == hi:
+            return math.nan
+        levels = self._blocks(kind)
+        first_block = -(-lo // range_block_days)
+        last_block = hi // range_block_days
+        if first_block >= last_block:
+            value = self._scan(kind, lo, hi)
+        else:
+            level = (last_block - first_block).bit_length() - 1
+            row = levels[level]
+            value = self._range_kinds[kind][0](
+                row[first_block], row[last_block - (1 << level)],
+                self._scan(kind, lo, first_block * range_block_days),
+                self._scan(kind, last_block * range_block_days, hi))
+        return math.nan if math.isinf(value) else value
 
+    @timed("min_temp")
+    def min_temp(self, start=None, end=None):
+        """Return the lowest reading between optional dates."""
+        return self._range_pick("min", start, end)
+
+    @timed("max_temp")
+    def max_temp(self, start=None, end=None):
+        """Return the highest reading between optional dates."""
+        return self._range_pick("max", start, end)
+
+    def _sorted(self):
+        """Build (sorted temps, their positions) once per loaded window."""
+        if self._sorted_index is None:
+            positions = sorted((position for position, temp
+                                in enumerate(self._temps)
+                                if not math.isnan(temp)),
+                               key=self._temps.__getitem__)
+            self._sorted_index = (
+                array("d", [self._temps[position] for position in positions]),
+                array("l", positions))
+            self._grew()
+        return self._sorted_index
+
+    @timed("extreme_days")
     def extreme_days(self, threshold: float):
-        """Extract date/temp tuples using list comprehension."""
-        return [item for item in self._temp_list if item[1] > threshold]
+        """Return date/temp tuples above threshold, in date order."""
+        temps, positions = self._sorted()
+        above = sorted(positions[bisect.bisect_right(temps, threshold):])
+        return [(self._day(position), self._temps[position])
+                for position in above]
+
+    @timed("count_days_above")
+    def count_days_above(self, thresholds):
+        """Count days above each threshold using the sorted index."""
+        temps, _ = self._sorted()
+        return [len(temps) - bisect.bisect_right(temps, threshold)
+                for threshold in thresholds]
+
+    def _valid_positions(self):
+        """Yield positions of days that have a reading."""
+        return (position for position, temp in enumerate(self._temps)
+                if not math.isnan(temp))
 
+    @timed("top_x_days")
     def top_x_days(self, num_days=10):
-        """Return tuples list of set days with the highest temperatures."""
-        return sorted(self._temp_list, reverse=True,
-                      key=lambda item: item[1])[:num_days]
+        """Return tuples list of set days with the highest temperatures.
+
+        Ties keep date order. The sorted index is reused when it already
+        exists, otherwise a heap selects the days without a full sort.
+        """
+        if num_days <= 0:
+            return []
+        if self._sorted_index is not None:
+            temps, positions = self._sorted_index
+            if not temps:
+                return []
+            cut = bisect.bisect_left(temps,
+                                     temps[max(len(temps) - num_days, 0)])
+            chosen = sorted(positions[cut:], key=lambda position: (
+                -self._temps[position], position))[:num_days]
+        else:
+            chosen = heapq.nlargest(num_days, self._valid_positions(),
+                                    key=self._temps.__getitem__)
+        return [(self._day(position), self._temps[position])
+                for position in chosen]
+
+    @timed("bottom_x_days")
+    def bottom_x_days(self, num_days=10):
+        """Return tuples list of set days with the lowest temperatures."""
+        if num_days <= 0:
+            return []
+        if self._sorted_index is not None:
+            chosen = self._sorted_index[1][:num_days]
+        else:
+            chosen = heapq.nsmallest(num_days, self._valid_positions(),
+                                     key=self._temps.__getitem__)
+        return [(self._day(position), self._temps[position])
+                for position in chosen]
+
+
+async def load_datasets_async(zip_codes, start="1950-08-13",
+                              end="2023-08-25",
+                              concurrency=async_concurrency, variables=()):
+    """Yield (zip_code, dataset, error) as each location finishes loading.
+
+    At most concurrency loads run at once. Each load is the normal
+    HistoricalTemps constructor run off the event loop, so parsing and
+    validation are exactly the synchronous path's.
+    """
+    asyncio = lazy_import("asyncio")
+    zip_codes = list(dict.fromkeys(str(zip_code).strip()
+                                   for zip_code in zip_codes))
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        await loop.run_in_executor(pool, zip_lookup_cache.lookup_many,
+                                   zip_codes)
+
+        async def load(zip_code):
+            async with limit:
+                try:
+                    dataset = await loop.run_in_executor(
+                        pool, HistoricalTemps, zip_code, start, end,
+                        variables)
+                except Exception as error:
+                    return (zip_code, None,
+                            f"{type(error).__name__}: {error}")
+                return zip_code, dataset, None
+
+        for next_done in asyncio.as_completed(
+                [load(zip_code) for zip_code in zip_codes]):
+            yield await next_done
+
+
+class HistoricalAirQuality:
+    """Create class with daily air quality built from hourly readings.
+
+    Hourly pm2_5/pm10/ozone are fetched a calendar month at a time and
+    folded into daily mean, max and hours-over-limit columns as each
+    month arrives. The raw hourly values are only kept with
+    keep_hourly=True.
+    """
+
+    def __init__(self, zip_code: str, start="2022-08-01", end="2023-08-25",
+                 pollutants=tuple(air_quality_limits), keep_hourly=False,
+                 limits=None):
+        """Geocode the zip, then fetch and downsample the whole window."""
+        self._zip_code = zip_code
+        self._start = start
+        self._end = end
+        self._pollutants = tuple(pollutants)
+        self._limits = dict(air_quality_limits, **(limits or {}))
+        self._keep_hourly = keep_hourly
+        self._lat, self._lon, self._loc_name = (
+            HistoricalTemps.zip_to_loc_info(zip_code))
+        self._first_day = None
+        self._daily = {}
+        self._hourly = {}
+        self._load_air_quality()
+
+    @property
+    def zip_code(self):
+        """Run zip_code getter here."""
+        return self._zip_code
+
+    @property
+    def loc_name(self):
+        """Run loc_name getter here."""
+        return self._loc_name
+
+    @property
+    def start(self):
+        """Run start getter here."""
+        return self._start
+
+    @property
+    def end(self):
+        """Run end getter here."""
+        return self._end
+
+    @property
+    def pollutants(self):
+        """Run pollutants getter here."""
+        return self._pollutants
+
+    def _load_air_quality(self):
+        """Fetch the window chunk by chunk, keeping daily aggregates."""
+        first = date_to_ordinal(self._start)
+        last = date_to_ordinal(self._end)
+        if first > last:
+            raise LookupError(f"{self._start} is after {self._end}")
+        days = last - first + 1
+        daily = {(pollutant, stat): array("d", [math.nan]) * days
+                 for pollutant in self._pollutants
+                 for stat in ("mean", "max", "hours_over")}
+        hourly = {}
+        if self._keep_hourly:
+            hourly = {pollutant: array("d", [math.nan]) * (24 * days)
+                      for pollutant in self._pollutants}
+        for chunk_first, chunk_last in self._month_chunks(first, last):
+            day, columns = self._fetch_hours(ordinal_to_date(chunk_first),
+                                             ordinal_to_date(chunk_last))
+            if day is None:
+                continue
+            skip = max(first - day, 0)
+            offset = day + skip - first
+            for pollutant, values in columns.items():
+                values = values[24 * skip:24 * (days - offset)]
+                if pollutant in hourly:
+                    hours = slice(24 * offset, 24 * offset + len(values))
+                    hourly[pollutant][hours] = values
+                self._downsample(daily, pollutant, offset, values)
+        self._daily = daily
+        self._hourly = hourly
+        self._first_day = first
+
+    @staticmethod
+    def _month_chunks(first, last):
+        """Split days into calendar months covering them.
+
+        Past months are fetched whole, so any window touching a month
+        shares its cache entry; only the daily aggregates for the window
+        are kept. Months the archive may still revise are clipped to the
+        requested days.
+        """
+        cutoff = (datetime.date.today()
+                  - datetime.timedelta(days=archive_delay_days)).toordinal()
+        month = datetime.date.fromordinal(first).replace(day=1)
+        chunks = []
+        while True:
+            chunk_first = month.toordinal()
+            chunk_last = chunk_first + calendar.monthrange(
+                month.year, month.month)[1] - 1
+            if chunk_last > cutoff:
+                chunks.append((max(chunk_first, first),
+                               min(chunk_last, last)))
+            else:
+                chunks.append((chunk_first, chunk_last))
+            if chunk_last >= last:
+                return chunks
+            month = datetime.date.fromordinal(chunk_last + 1)
+
+    def _downsample(self, daily, pollutant, offset, values):
+        """Fold one chunk of hourly values into the daily columns."""
+        limit = self._limits.get(pollutant, math.inf)
+        for hour in range(0, len(values), 24):
+            position = offset + hour // 24
+            if position >= len(daily[pollutant, "mean"]):
+                break
+            readings = [value for value in values[hour:hour + 24]
+                        if not math.isnan(value)]
+            if not readings:
+                continue
+            daily[pollutant, "mean"][position] = sum(readings) / len(readings)
+            daily[pollutant, "max"][position] = max(readings)
+            daily[pollutant, "hours_over"][position] = sum(
+                reading > limit for reading in readings)
+
+    @timed("air_quality_fetch")
+    def _fetch_hours(self, start, end):
+        """Call the air quality API for one chunk, through the cache."""
+        parameters = {"latitude": self._lat,
+                      "longitude": self._lon,
+                      "start_date": start,
+                      "end_date": end,
+                      "hourly": ",".join(self._pollutants),
+                      "timezone": "America/Los_Angeles"
+                      }
+        entry = air_quality_cache.open_entry(parameters)
+        if entry is not None:
+            decoder = DailyColumnsDecoder(self._pollutants, block="hourly")
+            try:
+                with entry:
+                    for chunk in iter(lambda: entry.read(stream_chunk_size),
+                                      b""):
+                        decoder.feed(chunk)
+                return decoder.close()
+            except ValueError:
+                air_quality_cache.discard(parameters)
+        decoder = DailyColumnsDecoder(self._pollutants, block="hourly")
+        try:
+            with air_quality_client.get(parameters, stream=True) as response:
+                chunks = response.iter_content(stream_chunk_size)
+                if response.status_code == 200:
+                    chunks = air_quality_cache.tee(parameters, chunks)
+                for chunk in chunks:
+                    decoder.feed(chunk)
+                return decoder.close()
+        except lazy_import("requests").RequestException as error:
+            raise LookupError(f"air quality request failed: {error}")
+        except ValueError as error:
+            air_quality_cache.discard(parameters)
+            raise LookupError(f"air quality response could not be read: "
+                              f"{error}")
+
+    def _series(self, pollutant, stat):
+        """Return (date, value) tuples for one daily aggregate."""
+        if pollutant not in self._pollutants:
+            raise LookupError(f"{pollutant} was not loaded for this dataset")
+        return [(ordinal_to_date(self._first_day + position), value)
+                for position, value in enumerate(self._daily[pollutant, stat])]
+
+    def daily_mean(self, pollutant="pm2_5"):
+        """Return date/daily mean tuples for one pollutant."""
+        return self._series(pollutant, "mean")
+
+    def daily_max(self, pollutant="pm2_5"):
+        """Return date/daily max tuples for one pollutant."""
+        return self._series(pollutant, "max")
+
+    def hours_over_limit(self, pollutant="pm2_5"):
+        """Return date/hours-above-limit tuples for one pollutant."""
+        return self._series(pollutant, "hours_over")
+
+    def exceedance_days(self, pollutant="pm2_5"):
+        """Return date/daily mean tuples where the mean beat the limit."""
+        limit = self._limits.get(pollutant, math.inf)
+        return [item for item in self.daily_mean(pollutant)
+                if item[1] > limit]
+
+    def average(self, pollutant="pm2_5"):
+        """Compute the window's average of daily means for a pollutant."""
+        means = [value for _, value in self.daily_mean(pollutant)
+                 if not math.isnan(value)]
+        if not means:
+            return math.nan
+        return sum(means) / len(means)
+
+    def hourly(self, pollutant="pm2_5"):
+        """Return raw hourly values, if the dataset was asked to keep them."""
+        if pollutant not in self._hourly:
+            raise LookupError("hourly values were not kept; pass "
+                              "keep_hourly=True")
+        return array("d", self._hourly[pollutant])
+
+
+class Workspace:
+    """Hold any number of named datasets under a memory budget.
+
+    Datasets are kept in least recently used order. When the series
+    data of all datasets goes over memory_budget, the oldest ones
+    release their series (keeping metadata) and reload them, usually
+    from the response cache, the next time they are used. A reload or
+    a new index counts as a use and enforces the budget again, so
+    walking every dataset never holds much more than the budget.
+    """
+
+    def __init__(self, memory_budget=workspace_budget_bytes):
+        """Start with no datasets."""
+        self.memory_budget = memory_budget
+        self._datasets = OrderedDict()
+        self._added = {}
+
+    def __len__(self):
+        """Return how many datasets are held."""
+        return len(self._datasets)
+
+    def __contains__(self, name):
+        """Tell whether a dataset with this name is held."""
+        return name in self._datasets
+
+    def names(self):
+        """Return dataset names in the order they were added."""
+        return list(self._added)
+
+    def datasets(self):
+        """Return every dataset in the order they were added."""
+        return [self._datasets[name] for name in self._added]
+
+    def add(self, name, dataset):
+        """Add or replace a dataset, then enforce the budget."""
+        replaced = self._datasets.pop(name, None)
+        if replaced is not None:
+            replaced.on_grow = None
+        self._datasets[name] = dataset
+        self._added.setdefault(name, None)
+        dataset.on_grow = partial(self._grown, name)
+        self.enforce_budget(keep=name)
+
+    def _grown(self, name):
+        """Mark a dataset that just grew as used, then trim the others."""
+        if name in self._datasets:
+            self._datasets.move_to_end(name)
+            self.enforce_budget(keep=name)
+
+    def get(self, name):
+        """Return a dataset (or None), marking it most recently used."""
+        dataset = self._datasets.get(name)
+        if dataset is not None:
+            self._datasets.move_to_end(name)
+            self.enforce_budget(keep=name)
+        return dataset
+
+    def peek(self, name):
+        """Return a dataset (or None) without touching LRU order."""
+        return self._datasets.get(name)
+
+    def remove(self, name):
+        """Drop a dataset, returning it (or None if it was not held)."""
+        self._added.pop(name, None)
+        dataset = self._datasets.pop(name, None)
+        if dataset is not None:
+            dataset.on_grow = None
+        return dataset
+
+    def compare(self, start=None, end=None):
+        """Return a LocationComparison over every dataset held."""
+        return LocationComparison(self.datasets(), start, end)
+
+    def memory_usage(self):
+        """Return {name: bytes} of series data held by each dataset."""
+        return {name: dataset.memory_bytes()
+                for name, dataset in self._datasets.items()}
+
+    def enforce_budget(self, keep=None):
+        """Release least recently used series until under the budget."""
+        usage = self.memory_usage()
+        total = sum(usage.values())
+        for name, dataset in self._datasets.items():
+            if total <= self.memory_budget:
+                break
+            if name == keep or not usage[name]:
+                continue
+            dataset.release_series()
+            total -= usage[name]
+
+
+class LocationComparison:
+    """Compare many datasets at once on one location x day array.
+
+    Every dataset's max temperatures are placed on a shared date axis
+    (NaN where a location has no reading), so each statistic is a
+    single NumPy reduction over all locations.
+    """
+
+    def __init__(self, datasets, start=None, end=None):
+        """Align the datasets' series into one 2-D float64 array."""
+        np = lazy_import("numpy")
+        self.datasets = list(datasets)
+        if not self.datasets:
+            raise LookupError("no datasets to compare")
+        firsts = [dataset._first_day for dataset in self.datasets]
+        lasts = [date_to_ordinal(dataset.end) for dataset in self.datasets]
+        self.first_day = (min(firsts) if start is None
+                          else date_to_ordinal(start))
+        last_day = max(lasts) if end is None else date_to_ordinal(end)
+        if self.first_day > last_day:
+            raise LookupError("start is after end")
+        self.temps = np.full((len(self.datasets),
+                              last_day - self.first_day + 1), np.nan)
+        for row, dataset in enumerate(self.datasets):
+            lo = max(dataset._first_day, self.first_day)
+            hi = min(lasts[row], last_day)
+            if lo > hi:
+                continue
+            values = np.frombuffer(dataset._temps, dtype=np.float64)
+            self.temps[row, lo - self.first_day:hi - self.first_day + 1] = (
+                values[lo - dataset._first_day:hi - dataset._first_day + 1])
+
+    def statistics(self, threshold=35.0, percentile=90.0):
+        """Return {name: per-location array} for every statistic."""
+        np = lazy_import("numpy")
+        readings = ~np.isnan(self.temps)
+        days = readings.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            average = np.where(readings, self.temps, 0.0).sum(axis=1) / days
+        empty = days == 0
+        filled = np.where(readings, self.temps, -np.inf)
+        hottest = np.where(empty, np.nan, filled.max(axis=1))
+        filled = np.where(readings, self.temps, np.inf)
+        coldest = np.where(empty, np.nan, filled.min(axis=1))
+        ranks = np.full(len(self.datasets), np.nan)
+        if not empty.all():
+            ranks[~empty] = np.nanpercentile(self.temps[~empty], percentile,
+                                             axis=1)
+        return {"average": average, "percentile": ranks,
+                "days_above": (self.temps > threshold).sum(axis=1),
+                "max": hottest, "min": coldest, "days": days}
+
+    def table(self, threshold=35.0, percentile=90.0, sort_by="average",
+              descending=True):
+        """Return one dict per location, sorted by a statistic."""
+        np = lazy_import("numpy")
+        stats = self.statistics(threshold, percentile)
+        if sort_by not in stats:
+            raise LookupError(f"cannot sort by {sort_by}")
+        key = np.where(np.isnan(stats[sort_by]), -np.inf if descending
+                       else np.inf, stats[sort_by])
+        order = np.argsort(-key if descending else key, kind="stable")
+        return [{"zip_code": self.datasets[row].zip_code,
+                 "loc_name": self.datasets[row].loc_name,
+                 **{name: values[row].item()
+                    for name, values in stats.items()}}
+                for row in order]
+
+    def hottest(self, num_locations=10, by="average", threshold=35.0,
+                percentile=90.0):
+        """Return table rows for the num_locations hottest locations."""
+        return self.table(threshold, percentile, by)[:num_locations]
 
 
 def create_dataset():
@@ -122,16 +1985,37 @@ def create_dataset():
     return hist_temp
 
 
-def compare_average_temps(dataset_one: HistoricalTemps,
-                          dataset_two: HistoricalTemps):
-    """Once loaded, compare average temps of both datasets."""
-    if dataset_one is None or dataset_two is None:
+def choose_dataset(workspace: Workspace):
+    """Pick a dataset from the workspace, asking only if there are many."""
+    names = workspace.names()
+    if len(names) <= 1:
+        return workspace.get(names[0]) if names else None
+    print("Loaded datasets: " + ", ".join(
+        f"{name} ({workspace.peek(name).loc_name})" for name in names))
+    return workspace.get(input("Which zip code? ").strip())
+
+
+def compare_average_temps(*datasets: HistoricalTemps):
+    """Once loaded, compare average temps of every dataset given."""
+    if len(datasets) < 2 or any(dataset is None for dataset in datasets):
         print("Please load two datasets first")
     else:
-        print(f"The average maximum temperature for {dataset_one.loc_name} "
-              f"was{dataset_one.average_temp(): .2f} degrees Celsius")
-        print(f"The average maximum temperature for {dataset_two.loc_name} "
-              f"was{dataset_two.average_temp(): .2f} degrees Celsius")
+        for dataset in datasets:
+            print(f"The average maximum temperature for {dataset.loc_name} "
+                  f"was{dataset.average_temp(): .2f} degrees Celsius")
+
+
+def print_workspace(workspace: Workspace):
+    """List loaded datasets with the memory their series are using."""
+    if not len(workspace):
+        print("No datasets are loaded")
+        return
+    usage = workspace.memory_usage()
+    for name in workspace.names():
+        print(f"{name}: {workspace.peek(name).loc_name}, "
+              f"{usage[name] / 1024:.1f} KiB")
+    print(f"Total {sum(usage.values()) / 1024:.1f} KiB of "
+          f"{workspace.memory_budget / 1024:.0f} KiB budget")
 
 
 def print_extreme_days(dataset: HistoricalTemps):
@@ -168,34 +2052,259 @@ def change_dates(dataset: HistoricalTemps):
     if dataset is None:
         print("Please load this dataset first")
         return
+    start = input("Please enter a new start date (YYYY-MM-DD): ")
+    end = input("Please enter a new end date (YYYY-MM-DD): ")
     try:
-        dataset.start = input("Please enter a new start date (YYYY-MM-DD): ")
+        dataset.set_range(start, end)
     except LookupError:
-        print(f"Start date could not be changed.  Please check that the "
-              f"start date is in the correct format and is before the "
-              f"current end date of {dataset.end}")
-        return
+        print(f"Dates could not be changed.  Please check that both dates "
+              f"are in the correct format and that the start date is "
+              f"before the end date.  Keeping {dataset.start} to "
+              f"{dataset.end}")
+
+
+class RowWriter:
+    """Stream result rows to a file as JSON Lines or CSV."""
+
+    def __init__(self, stream, output_format, fields):
+        """Write the CSV header up front; JSON Lines needs none."""
+        self._stream = stream
+        self._csv = None
+        if output_format == "csv":
+            self._csv = csv.DictWriter(stream, fieldnames=fields,
+                                       extrasaction="ignore")
+            self._csv.writeheader()
+
+    def write(self, row):
+        """Write one row and flush so pipelines see it right away.
+
+        NaN (a window with no readings) becomes null, or an empty CSV
+        cell, since JSON has no NaN.
+        """
+        row = {key: None if isinstance(value, float) and math.isnan(value)
+               else value for key, value in row.items()}
+        if self._csv is None:
+            self._stream.write(json.dumps(row, allow_nan=False) + "\n")
+        else:
+            self._csv.writerow(row)
+        self._stream.flush()
+
+
+batch_fields = {
+    "average": ["zip_code", "loc_name", "start", "end", "average"],
+    "extreme-days": ["zip_code", "loc_name", "start", "end", "threshold",
+                     "date", "temp"],
+    "top-days": ["zip_code", "loc_name", "start", "end", "rank", "date",
+                 "temp"],
+    "compare": ["start", "end", "rank", "zip_code", "loc_name", "average",
+                "percentile", "days_above", "max", "min", "days"],
+}
+
+
+def date_range(text):
+    """Parse a START:END argument into a (start, end) tuple."""
+    start, separator, end = text.partition(":")
+    if not separator:
+        raise argparse.ArgumentTypeError("expected START:END")
+    for date_str in (start, end):
+        try:
+            date_to_ordinal(date_str)
+        except LookupError as error:
+            raise argparse.ArgumentTypeError(str(error))
+    return start, end
+
+
+def build_parser():
+    """Describe the non-interactive batch command line."""
+    parser = argparse.ArgumentParser(
+        description="Explore historical temperatures without prompts. "
+                    "Run without a subcommand for the interactive menu.")
+    parser.add_argument("--metrics", metavar="PATH",
+                        default=os.environ.get("ELEVEN_METRICS"),
+                        help="record per-phase timings and write them on "
+                             "exit (.prom for Prometheus text, else JSON)")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="report startup time and heavy imports to "
+                             "stderr")
+    parser.add_argument("--profile", metavar="DIR",
+                        default=os.environ.get("ELEVEN_PROFILE"),
+                        help="profile the session with cProfile and "
+                             "tracemalloc and write reports to DIR")
+    commands = parser.add_subparsers(dest="command")
+    for name, summary in (("average", "average max temperature"),
+                          ("extreme-days", "days above a threshold"),
+                          ("top-days", "hottest (or coldest) days"),
+                          ("compare", "rank locations against each other")):
+        command = commands.add_parser(name, help=summary)
+        command.add_argument("zip_codes", nargs="+", metavar="ZIP")
+        command.add_argument("--start", default="1950-08-13")
+        command.add_argument("--end", default="2023-08-25")
+        command.add_argument("--range", dest="ranges", action="append",
+                             type=date_range, metavar="START:END",
+                             help="date range; repeat for several")
+        command.add_argument("--format", choices=("jsonl", "csv"),
+                             default="jsonl")
+        command.add_argument("--workers", type=int, default=load_workers)
+        command.add_argument("--batch-size", type=int, default=0,
+                             help="merge requests into multi-location "
+                                  "calls of this size (0 = off)")
+    commands.choices["extreme-days"].add_argument("--threshold", type=float,
+                                                  required=True)
+    commands.choices["top-days"].add_argument("--num-days", type=int,
+                                              default=5)
+    commands.choices["top-days"].add_argument("--coldest",
+                                              action="store_true")
+    compare = commands.choices["compare"]
+    compare.add_argument("--threshold", type=float, default=35.0)
+    compare.add_argument("--percentile", type=float, default=90.0)
+    compare.add_argument("--sort-by", default="average",
+                         choices=("average", "percentile", "days_above",
+                                  "max", "min"))
+    compare.add_argument("--limit", type=int, default=None)
+    index = commands.add_parser("build-zip-index",
+                                help="compile the compact zip index")
+    index.add_argument("--path", default=zip_index_path)
+    startup = commands.add_parser("startup-check",
+                                  help="fail if cold start is over budget")
+    startup.add_argument("--budget", type=float, default=startup_budget)
+    bench = commands.add_parser("bench", help="run the benchmark suite")
+    bench.add_argument("--output", default=bench_results_path,
+                       help="JSON Lines file results are appended to")
+    bench.add_argument("--repeat", type=int, default=5)
+    bench.add_argument("--quick", action="store_true",
+                       help="smaller sizes for a fast smoke run")
+    bench.add_argument("--only", help="run benchmarks whose name has this")
+    bench.add_argument("--fail-on-regression", action="store_true",
+                       help=f"exit 1 if any benchmark is over "
+                            f"{bench_regression_ratio}x its last run")
+    load = commands.add_parser("loadtest",
+                               help="drive dataset creation against a "
+                                    "local stand-in archive")
+    load.add_argument("--datasets", type=int, default=500)
+    load.add_argument("--rate", type=float, default=50.0,
+                      help="dataset creations started per second")
+    load.add_argument("--concurrency", type=int, default=64)
+    load.add_argument("--years", type=int, default=10)
+    load.add_argument("--latency", type=float, default=0.05,
+                      help="seconds the stand-in waits per response")
+    load.add_argument("--error-rate", type=float, default=0.0)
+    load.add_argument("--throttle-rate", type=float, default=0.0,
+                      help="share of responses that are 429s")
+    load.add_argument("--padding", type=int, default=0,
+                      help="extra bytes added to every response body")
+    return parser
+
+
+def dataset_rows(args, dataset):
+    """Turn one loaded dataset into output rows for a subcommand."""
+    base = {"zip_code": dataset.zip_code, "loc_name": dataset.loc_name,
+            "start": dataset.start, "end": dataset.end}
+    if args.command == "average":
+        return [dict(base, average=dataset.average_temp())]
+    if args.command == "extreme-days":
+        return [dict(base, threshold=args.threshold, date=date, temp=temp)
+                for date, temp in dataset.extreme_days(args.threshold)]
+    days = (dataset.bottom_x_days(args.num_days) if args.coldest
+            else dataset.top_x_days(args.num_days))
+    return [dict(base, rank=rank, date=date, temp=temp)
+            for rank, (date, temp) in enumerate(days, 1)]
+
+
+def run_batch(args, stream=None):
+    """Run one batch subcommand, streaming rows; return an exit code."""
+    stream = sys.stdout if stream is None else stream
+    if args.startup_profile:
+        print(json.dumps(startup_report()), file=sys.stderr)
+    if args.command == "startup-check":
+        report = check_startup(args.budget)
+        print(json.dumps(report), file=stream)
+        return 0 if report["ok"] else 1
+    if args.command == "build-zip-index":
+        print(build_zip_index(args.path), file=stream)
+        return 0
+    if args.command == "loadtest":
+        print(json.dumps(lazy_import("bench").run_load_test(
+            args.datasets, args.rate, args.concurrency, args.years,
+            args.latency, args.error_rate, args.throttle_rate,
+            args.padding)), file=stream)
+        return 0
+    if args.command == "bench":
+        regressed = False
+        results = lazy_import("bench").run_benchmarks(
+            args.output, args.repeat, args.quick, args.only)
+        for result in results:
+            print(json.dumps(result), file=stream, flush=True)
+            regressed |= (result["ratio"] or 0) > bench_regression_ratio
+        return 1 if regressed and args.fail_on_regression else 0
+    writer = RowWriter(stream, args.format, batch_fields[args.command])
+    zip_codes = list(dict.fromkeys(args.zip_codes))
+    zip_lookup_cache.lookup_many(zip_codes)
+    previous = None
+    if args.batch_size > 0:
+        previous = set_archive_batcher(ArchiveBatcher(
+            batch_size=args.batch_size))
+    failed = False
     try:
-        dataset.end = input("Please enter a new end date (YYYY-MM-DD): ")
-    except LookupError:
-        print(f"End date could not be changed.  Please check that the "
-              f"end date is in the correct format and is after the "
-              f"current start date of {dataset.start}")
+        for start, end in args.ranges or [(args.start, args.end)]:
+            with ThreadPoolExecutor(max_workers=args.workers) as pool:
+                loads = {pool.submit(HistoricalTemps, zip_code, start, end):
+                         zip_code for zip_code in zip_codes}
+                datasets = []
+                for load in as_completed(loads):
+                    zip_code = loads.pop(load)
+                    try:
+                        dataset = load.result()
+                    except Exception as error:
+                        failed = True
+                        print(json.dumps({"zip_code": zip_code,
+                                          "start": start, "end": end,
+                                          "error": str(error)}),
+                              file=sys.stderr)
+                        continue
+                    if args.command == "compare":
+                        datasets.append(dataset)
+                        continue
+                    for row in dataset_rows(args, dataset):
+                        writer.write(row)
+            if args.command == "compare" and datasets:
+                table = LocationComparison(datasets).table(
+                    args.threshold, args.percentile, args.sort_by)
+                for rank, row in enumerate(table[:args.limit], 1):
+                    writer.write(dict(row, start=start, end=end, rank=rank))
+    finally:
+        if args.batch_size > 0:
+            set_archive_batcher(previous)
+    return 1 if failed else 0
 
 
-def main():
-    """Prompt user for name, then greet them and state activity."""
-    name = input("Please enter your name: ")
-    print(f"Hi {name}, let's explore historical temperatures.\n")
-    menu()
+def main(argv=None):
+    """Prompt user for name, then greet them and state activity.
+
+    A subcommand runs the batch mode instead of the menu. --metrics and
+    --profile (or ELEVEN_METRICS / ELEVEN_PROFILE) work for both.
+    """
+    args = build_parser().parse_args(sys.argv[1:] if argv is None
+                                     else argv)
+    if args.metrics:
+        metrics.enable()
+    try:
+        with profiling(args.profile) if args.profile else nullcontext():
+            if args.command is not None:
+                return run_batch(args)
+            name = input("Please enter your name: ")
+            print(f"Hi {name}, let's explore historical temperatures.\n")
+            menu()
+            return 0
+    finally:
+        if args.metrics:
+            metrics.write(args.metrics)
 
 
 def menu():
     """Ask user to select item to get output. Pass in dataset arguments."""
-    dataset_one = None
-    dataset_two = None
+    workspace = Workspace()
     while True:
-        print_menu(dataset_one, dataset_two)
+        print_menu(workspace)
         try:
             number = int(input("What is your choice? "))
         except ValueError:
@@ -203,21 +2312,24 @@ def menu():
             continue
         match number:
             case 1:
-                dataset_one = create_dataset()
+                dataset = create_dataset()
+                if dataset is not None:
+                    workspace.add(dataset.zip_code, dataset)
                 continue
             case 2:
-                dataset_two = create_dataset()
-                continue
+                if workspace.remove(input("Remove which zip code? ").strip()
+                                    ) is None:
+                    print("That dataset is not loaded")
             case 3:
-                compare_average_temps(dataset_one, dataset_two)
+                compare_average_temps(*workspace.datasets())
             case 4:
-                print_extreme_days(dataset_one)
+                print_extreme_days(choose_dataset(workspace))
             case 5:
-                print_top_five_days(dataset_one)
+                print_top_five_days(choose_dataset(workspace))
             case 6:
-                change_dates(dataset_one)
+                change_dates(choose_dataset(workspace))
             case 7:
-                change_dates(dataset_two)
+                print_workspace(workspace)
             case 9:
                 print("Goodbye!  Thank you for using the database")
                 break
@@ -225,24 +2337,20 @@ def menu():
                 print("That's not a valid selection")
 
 
-def print_menu(dataset_one: HistoricalTemps, dataset_two: HistoricalTemps):
-    """Display Main Menu for user selection, and include two parameters."""
+def print_menu(workspace: Workspace):
+    """Display Main Menu for user selection, and include the workspace."""
     print("Main Menu")
-    if dataset_one is None:
-        print("1 - Load dataset one")
-    else:
-        print(f"1 - Replace {dataset_one.loc_name}")
-    if dataset_two is None:
-        print("2 - Load dataset two")
-    else:
-        print(f"2 - Replace {dataset_two.loc_name}")
+    print(f"1 - Load a dataset ({len(workspace)} loaded)")
+    print("2 - Remove a dataset")
     print("3 - Compare average temperatures")
     print("4 - Dates above threshold temperature")
     print("5 - Highest historical dates")
-    print("6 - Change start and end dates for dataset one")
-    print("7 - Change start and end dates for dataset two")
+    print("6 - Change start and end dates for a dataset")
+    print("7 - Show loaded datasets and memory use")
     print("9 - Quit")
 
 
 if __name__ == "__main__":
-    main()
+    # bench imports this module by name; let it share the running copy.
+    sys.modules.setdefault("Eleven", sys.modules[__name__])
+    sys.exit(main())
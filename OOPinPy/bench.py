@@ -0,0 +1,543 @@
+"""Benchmarks, a stand-in archive server and a load test for Eleven.py.
+
+Kept out of the main script so the interactive tool never pays for
+http.server and friends; Eleven.py imports this only for its bench and
+loadtest subcommands.
+"""
+
+
+import time
+import math
+import json
+import threading
+import os
+import sys
+import datetime
+import random
+import tempfile
+import subprocess
+import statistics
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from array import array
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from Eleven import (ArchiveClient, DaySegments, HistoricalTemps,
+                    LocationComparison, ResponseCache, bench_results_path,
+                    date_to_ordinal, lazy_import, max_retries,
+                    ordinal_to_date, set_archive_client, set_response_cache,
+                    temp_variable, zip_lookup_cache)
+
+
+def synthetic_temps(first_day, days, lat=37.0):
+    """Return a repeatable, seasonal max temperature series."""
+    offset = int(abs(lat) * 1000)
+    return array("d", [
+        round(18 + 10 * math.sin(2 * math.pi * (day % 365.25) / 365.25)
+              + ((day * 7919 + offset) % 97) / 10, 1)
+        for day in range(first_day, first_day + days)])
+
+
+def synthetic_payload(start, end, variables=(temp_variable,), lat=37.0,
+                      lon=-122.0):
+    """Build an archive-shaped JSON body for a date range."""
+    first_day = date_to_ordinal(start)
+    days = date_to_ordinal(end) - first_day + 1
+    temps = list(synthetic_temps(first_day, days, lat))
+    daily = {"time": [ordinal_to_date(first_day + position)
+                      for position in range(days)]}
+    for variable in variables:
+        daily[variable] = temps
+    return {"latitude": lat, "longitude": lon, "generationtime_ms": 0.5,
+            "utc_offset_seconds": -25200,
+            "timezone": "America/Los_Angeles", "timezone_abbreviation": "PDT",
+            "elevation": 20.0,
+            "daily_units": dict({"time": "iso8601"},
+                                **{variable: "\u00b0C"
+                                   for variable in variables}),
+            "daily": daily}
+
+
+def synthetic_hours(first_day, hours, pollutant, lat=37.0):
+    """Return repeatable hourly readings, with every 50th hour missing."""
+    offset = int(abs(lat) * 1000) + sum(map(ord, pollutant))
+    return [None if (first_day * 24 + hour) % 50 == 0
+            else round(5 + ((first_day * 24 + hour) * 7919 + offset) % 600
+                       / 10, 1)
+            for hour in range(hours)]
+
+
+def synthetic_hourly_payload(start, end, pollutants, lat=37.0, lon=-122.0):
+    """Build an air-quality-shaped JSON body for a date range."""
+    first_day = date_to_ordinal(start)
+    days = date_to_ordinal(end) - first_day + 1
+    hourly = {"time": [f"{ordinal_to_date(first_day + hour // 24)}"
+                       f"T{hour % 24:02d}:00" for hour in range(24 * days)]}
+    for pollutant in pollutants:
+        hourly[pollutant] = synthetic_hours(first_day, 24 * days, pollutant,
+                                            lat)
+    return {"latitude": lat, "longitude": lon, "generationtime_ms": 0.5,
+            "timezone": "America/Los_Angeles",
+            "hourly_units": dict({"time": "iso8601"},
+                                 **{pollutant: "\u03bcg/m\u00b3"
+                                    for pollutant in pollutants}),
+            "hourly": hourly}
+
+
+def synthetic_dataset(years=75, zip_code="00000", lat=37.0,
+                      start="1950-01-01"):
+    """Build a HistoricalTemps from a synthetic series, without I/O."""
+    dataset = HistoricalTemps.__new__(HistoricalTemps)
+    first_day = date_to_ordinal(start)
+    temps = synthetic_temps(first_day, int(years * 365.25), lat)
+    dataset._zip_code = zip_code
+    dataset._start = start
+    dataset._end = ordinal_to_date(first_day + len(temps) - 1)
+    dataset._variables = (temp_variable,)
+    dataset._lat, dataset._lon, dataset._loc_name = lat, -122.0, zip_code
+    dataset._first_day = first_day
+    dataset._columns = {temp_variable: temps}
+    dataset._sorted_index = None
+    dataset._aggregates = None
+    dataset._segments = {temp_variable: DaySegments()}
+    dataset._segments[temp_variable].add(first_day, temps)
+    dataset.on_grow = None
+    return dataset
+
+
+class FakeArchiveServer:
+    """Serve synthetic open-meteo archive responses on localhost.
+
+    Handy as an injectable stand-in for ArchiveClient in benchmarks and
+    load tests. Requests with an "hourly" parameter get air-quality
+    shaped bodies. latency is added to every response, error_rate and
+    throttle_rate are the shares of requests answered with a 500 or a
+    429, and padding adds that many bytes to each successful body.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, throttle_rate=0.0,
+                 padding=0, retry_after="0", seed=0):
+        """Configure the server; call start() or use it as a context."""
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.padding = padding
+        self.retry_after = retry_after
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.days = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _answer(self, query):
+        """Return (status, body bytes) for one parsed query string."""
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            failed = roll < self.error_rate
+            throttled = not failed and roll < (self.error_rate
+                                               + self.throttle_rate)
+            self.errors += failed
+            self.throttled += throttled
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            return 500, b'{"error": true, "reason": "stand-in failure"}'
+        if throttled:
+            return 429, b'{"error": true, "reason": "too many requests"}'
+        if "hourly" in query:
+            build = partial(synthetic_hourly_payload,
+                            pollutants=query["hourly"].split(","))
+        else:
+            build = partial(synthetic_payload, variables=query.get(
+                "daily", temp_variable).split(","))
+        bodies = [build(query["start_date"], query["end_date"],
+                        lat=float(lat), lon=float(lon))
+                  for lat, lon in zip(query["latitude"].split(","),
+                                      query["longitude"].split(","))]
+        if self.padding:
+            for body in bodies:
+                body["padding"] = "x" * self.padding
+        with self._lock:
+            self.days += len(bodies) * (date_to_ordinal(query["end_date"])
+                                        - date_to_ordinal(
+                                            query["start_date"]) + 1)
+        body = bodies[0] if len(bodies) == 1 else bodies
+        return 200, json.dumps(body).encode()
+
+    def start(self):
+        """Start serving on a free port and return the archive url."""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                query = {key: values[0] for key, values
+                         in parse_qs(urlparse(self.path).query).items()}
+                status, body = server._answer(query)
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", server.retry_after)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+
+            def handle_error(self, request, client_address):
+                if not isinstance(sys.exc_info()[1], ConnectionError):
+                    super().handle_error(request, client_address)
+
+        self._server = Server(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever,
+                         daemon=True).start()
+        return self.url
+
+    @property
+    def url(self):
+        """Return the archive url of the running server."""
+        return f"http://127.0.0.1:{self._server.server_port}/v1/archive"
+
+    def stop(self):
+        """Shut the server down."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        """Start serving for the duration of a with block."""
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop serving at the end of a with block."""
+        self.stop()
+
+
+def serve_fake_archive(connection, options):
+    """Run a FakeArchiveServer until told to stop, then send its counts."""
+    with FakeArchiveServer(**options) as server:
+        connection.send(server.url)
+        connection.recv()
+    connection.send((server.requests, server.errors, server.throttled,
+                     server.days))
+
+
+class FakeArchiveProcess:
+    """Run a FakeArchiveServer in a child process.
+
+    Takes the same options. The stand-in's JSON generation then runs
+    outside the measured process and its GIL, so load-test numbers
+    describe the loader rather than the server. The request counters
+    are filled in when the server stops.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, throttle_rate=0.0,
+                 padding=0, retry_after="0", seed=0):
+        """Configure the server; call start() or use it as a context."""
+        self._options = {"latency": latency, "error_rate": error_rate,
+                         "throttle_rate": throttle_rate, "padding": padding,
+                         "retry_after": retry_after, "seed": seed}
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.days = 0
+        self.url = None
+        self._connection = None
+        self._process = None
+
+    def start(self):
+        """Start the child process and return the archive url."""
+        self._connection, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=serve_fake_archive, args=(child, self._options),
+            daemon=True)
+        self._process.start()
+        child.close()
+        self.url = self._connection.recv()
+        return self.url
+
+    def stop(self):
+        """Stop the child process and collect its request counters."""
+        self._connection.send("stop")
+        (self.requests, self.errors, self.throttled,
+         self.days) = self._connection.recv()
+        self._connection.close()
+        self._process.join()
+
+    def __enter__(self):
+        """Start serving for the duration of a with block."""
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop serving at the end of a with block."""
+        self.stop()
+
+
+def time_call(call, repeat=5):
+    """Return (best, median) seconds over repeat calls."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return min(timings), statistics.median(timings)
+
+
+def bench_decode(payload, streaming=True):
+    """Return a call decoding payload the new or the old way."""
+    def decode():
+        if streaming:
+            return HistoricalTemps._convert_json_to_columns(payload)
+        daily = json.loads(payload)["daily"]
+        return list(zip(daily["time"], daily[temp_variable]))
+    return decode
+
+
+def bench_query(years, method, args=(), warm=True):
+    """Return a call running one dataset query, with indexes warm or not."""
+    dataset = synthetic_dataset(years)
+    query = getattr(dataset, method)
+    if warm:
+        dataset._sorted()
+
+    def run():
+        if not warm:
+            dataset._sorted_index = None
+            dataset._aggregates = None
+        return query(*args)
+    run()
+    return run
+
+
+def bench_top_sort(years, num_days=10):
+    """Return a call ranking days the old way, by a full sort of tuples."""
+    rows = synthetic_dataset(years).daily_values()
+    return lambda: sorted(rows, reverse=True,
+                          key=lambda item: item[1])[:num_days]
+
+
+def bench_compare(locations, years):
+    """Return a call ranking synthetic locations."""
+    datasets = [synthetic_dataset(years, f"{row:05d}", 30 + row / 1000)
+                for row in range(locations)]
+    return lambda: LocationComparison(datasets).table()
+
+
+def benchmark_cases(quick=False):
+    """Yield (name, params, setup) for every benchmark in the suite.
+
+    setup() does the untimed preparation and returns the call to time,
+    or a (call, teardown) pair when something has to be cleaned up.
+    """
+    for years in (1, 10) if quick else (1, 10, 75):
+        params = {"years": years}
+        payload = json.dumps(synthetic_payload(
+            "1950-01-01", ordinal_to_date(date_to_ordinal("1950-01-01")
+                                          + int(years * 365.25) - 1)))
+        yield "decode_stream", params, partial(bench_decode, payload)
+        yield ("decode_json_loads", params,
+               partial(bench_decode, payload, streaming=False))
+        for name, method, args, warm in (
+                ("average_cold", "average_temp", (), False),
+                ("average_range", "average_temp",
+                 ("1950-06-01", "1950-08-31"), True),
+                ("extreme_days_cold", "extreme_days", (30.0,), False),
+                ("extreme_days", "extreme_days", (30.0,), True),
+                ("count_days_above_20", "count_days_above",
+                 (range(10, 30),), True),
+                ("top_x_days_heap", "top_x_days", (10,), False),
+                ("top_x_days_index", "top_x_days", (10,), True)):
+            yield name, params, partial(bench_query, years, method, args,
+                                        warm)
+        yield "top_x_days_sort", params, partial(bench_top_sort, years)
+    for locations, years in ((10, 10), (100, 1)) if quick else (
+            (1, 75), (100, 10), (1000, 1), (10000, 1)):
+        yield ("compare_locations", {"locations": locations, "years": years},
+               partial(bench_compare, locations, years))
+    for locations in (1, 10) if quick else (1, 10, 100):
+        yield ("load_end_to_end", {"locations": locations, "years": 10},
+               partial(end_to_end_load, locations, 10))
+
+
+def end_to_end_load(locations, years):
+    """Return (call, teardown) loading datasets from a local server.
+
+    Each call starts from an empty response cache, so every dataset
+    goes over HTTP to a FakeArchiveServer.
+    """
+    server = FakeArchiveServer()
+    server.start()
+    client = ArchiveClient(server.url)
+    zip_codes = [f"b{row:04d}" for row in range(locations)]
+    for row, zip_code in enumerate(zip_codes):
+        zip_lookup_cache.store(zip_code, (30 + row / 100, -100.0, zip_code))
+    end = ordinal_to_date(date_to_ordinal("2000-01-01")
+                          + int(years * 365.25) - 1)
+
+    def load():
+        previous_client = set_archive_client(client)
+        with tempfile.TemporaryDirectory() as directory:
+            previous_cache = set_response_cache(ResponseCache(directory))
+            try:
+                HistoricalTemps.from_zip_codes(zip_codes, "2000-01-01", end)
+            finally:
+                set_response_cache(previous_cache)
+                set_archive_client(previous_client)
+
+    def teardown():
+        client.close()
+        server.stop()
+    return load, teardown
+
+
+def percentile(values, share):
+    """Return the nearest-rank percentile (share in 0-100) of values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(share / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def peak_rss_mb():
+    """Return this process's peak resident set size in MiB, if known."""
+    try:
+        resource = lazy_import("resource")
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_load_test(datasets=500, rate=50.0, concurrency=64, years=10,
+                  latency=0.05, error_rate=0.0, throttle_rate=0.0,
+                  padding=0, retries=max_retries):
+    """Build datasets against a stand-in archive at a target rate.
+
+    Creations are started open-loop at rate per second on up to
+    concurrency threads, with an empty response cache. Latency is
+    measured from each creation's scheduled start, so queueing behind a
+    saturated pool shows up. The stand-in runs in its own process, so
+    peak RSS and timings cover only the loader. Each dataset asks for
+    exactly years of days, and the report carries both that span and
+    the days the stand-in actually served so the two can be checked
+    against each other. Returns a report dict.
+    """
+    server = FakeArchiveProcess(latency, error_rate, throttle_rate, padding)
+    server.start()
+    client = ArchiveClient(server.url, pool_size=concurrency,
+                           retries=retries, backoff=0.05)
+    zip_codes = [f"l{row:05d}" for row in range(datasets)]
+    for row, zip_code in enumerate(zip_codes):
+        zip_lookup_cache.store(zip_code, (25 + row / 1000, -100.0,
+                                          zip_code))
+    start = "2000-01-01"
+    end = ordinal_to_date(date_to_ordinal(start) + int(years * 365.25) - 1)
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+
+    def create(zip_code, scheduled):
+        try:
+            HistoricalTemps(zip_code, start, end)
+        except Exception as error:
+            with lock:
+                name = type(error).__name__
+                errors[name] = errors.get(name, 0) + 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - scheduled)
+
+    previous_client = set_archive_client(client)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            previous_cache = set_response_cache(ResponseCache(directory))
+            try:
+                began = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    for position, zip_code in enumerate(zip_codes):
+                        scheduled = began + position / rate
+                        time.sleep(max(scheduled - time.perf_counter(), 0))
+                        pool.submit(create, zip_code, scheduled)
+                duration = time.perf_counter() - began
+            finally:
+                set_response_cache(previous_cache)
+    finally:
+        set_archive_client(previous_client)
+        client.close()
+        server.stop()
+    return {"datasets": datasets, "target_rate": rate,
+            "concurrency": concurrency, "years": years,
+            "succeeded": len(latencies), "failed": sum(errors.values()),
+            "errors": errors, "duration": duration,
+            "throughput": len(latencies) / duration if duration else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "server_requests": server.requests,
+            "server_errors": server.errors,
+            "server_throttled": server.throttled,
+            "days_per_dataset": (date_to_ordinal(end)
+                                 - date_to_ordinal(start) + 1),
+            "server_days": server.days,
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def git_commit():
+    """Return the current git commit hash, or None outside a checkout."""
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                            capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return result.stdout.strip() or None
+
+
+def run_benchmarks(path=bench_results_path, repeat=5, quick=False,
+                   only=None):
+    """Run the suite, append results to path and compare to the last run.
+
+    Each result is a JSON line tagged with the git commit. Returns the
+    results with a "ratio" against the most recent run of the same
+    benchmark from a different commit (None if there is none).
+    """
+    previous = {}
+    commit = git_commit()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                record = json.loads(line)
+                if record.get("commit") != commit:
+                    previous[record["name"], json.dumps(
+                        record["params"], sort_keys=True)] = record
+    results = []
+    stamp = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    with open(path, "a", encoding="utf-8") as file:
+        for name, params, setup in benchmark_cases(quick):
+            if only and only not in name:
+                continue
+            call, teardown = setup(), None
+            if isinstance(call, tuple):
+                call, teardown = call
+            try:
+                best, median = time_call(call, repeat)
+            finally:
+                if teardown is not None:
+                    teardown()
+            record = {"commit": commit, "timestamp": stamp, "name": name,
+                      "params": params, "best": best, "median": median}
+            file.write(json.dumps(record) + "\n")
+            earlier = previous.get((name, json.dumps(params, sort_keys=True)))
+            results.append(dict(record, ratio=(
+                best / earlier["best"] if earlier and earlier["best"]
+                else None)))
+    return results
@@ -0,0 +1,84 @@
+"""Shared fixtures: import path, stand-in archive server and datasets."""
+
+
+import os
+import sys
+import math
+import random
+from array import array
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "OOPinPy"))
+
+import Eleven  # noqa: E402
+import bench  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def server():
+    """Serve synthetic archive responses for the whole test session."""
+    with bench.FakeArchiveServer() as running:
+        yield running
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Point datasets at an empty response cache in a temp directory."""
+    cache = Eleven.ResponseCache(str(tmp_path / "archive"))
+    previous = Eleven.set_response_cache(cache)
+    yield cache
+    Eleven.set_response_cache(previous)
+
+
+@pytest.fixture
+def archive(server, cache):
+    """Route archive calls to the stand-in server, uncached at first."""
+    client = Eleven.ArchiveClient(server.url, retries=1, backoff=0.01)
+    previous = Eleven.set_archive_client(client)
+    yield server
+    Eleven.set_archive_client(previous)
+    client.close()
+
+
+@pytest.fixture
+def zip_code():
+    """Register a made-up zip code so no geocoder is needed."""
+    Eleven.zip_lookup_cache.store("t0001", (37.0, -122.0, "Testville"))
+    return "t0001"
+
+
+@pytest.fixture
+def gappy():
+    """A synthetic 20-year dataset with scattered and blocked-out NaNs."""
+    dataset = bench.synthetic_dataset(20, start="1990-01-01")
+    values = array("d", dataset._temps)
+    rng = random.Random(7)
+    for position in rng.sample(range(len(values)), 500):
+        values[position] = math.nan
+    values[1000:1300] = array("d", [math.nan]) * 300
+    dataset._columns = {Eleven.temp_variable: values}
+    return dataset, values
+
+
+@pytest.fixture
+def readings(gappy):
+    """(date, temp) for every day of gappy that has a reading."""
+    dataset, values = gappy
+    return [(dataset._day(position), value)
+            for position, value in enumerate(values)
+            if not math.isnan(value)]
+
+
+@pytest.fixture
+def air_quality(server, tmp_path):
+    """Route air quality calls to the stand-in server, uncached at first."""
+    client = Eleven.ArchiveClient(server.url, retries=1, backoff=0.01)
+    cache = Eleven.ResponseCache(str(tmp_path / "air-quality"))
+    previous_client = Eleven.set_air_quality_client(client)
+    previous_cache = Eleven.set_air_quality_cache(cache)
+    yield cache
+    Eleven.set_air_quality_cache(previous_cache)
+    Eleven.set_air_quality_client(previous_client)
+    client.close()
@@ -0,0 +1,84 @@
+"""HistoricalAirQuality downsampling, month chunks and caching."""
+
+
+import math
+
+import pytest
+
+import Eleven
+import bench
+
+
+def expected_days(start, end, pollutant, limit):
+    """Return [(date, mean, max, hours over)] straight from the stand-in."""
+    first = Eleven.date_to_ordinal(start)
+    days = Eleven.date_to_ordinal(end) - first + 1
+    hours = bench.synthetic_hours(first, 24 * days, pollutant)
+    rows = []
+    for day in range(days):
+        readings = [value for value in hours[24 * day:24 * day + 24]
+                    if value is not None]
+        rows.append((Eleven.ordinal_to_date(first + day),
+                     sum(readings) / len(readings), max(readings),
+                     sum(reading > limit for reading in readings)))
+    return rows
+
+
+def test_daily_aggregates_across_month_edges(air_quality, server, zip_code):
+    dataset = Eleven.HistoricalAirQuality(zip_code, "2021-01-20",
+                                          "2021-03-05", keep_hourly=True)
+    rows = expected_days("2021-01-20", "2021-03-05", "pm2_5", 35.0)
+    assert [(date, pytest.approx(mean)) for date, mean
+            in dataset.daily_mean()] == [(row[0], row[1]) for row in rows]
+    assert [value for _, value in dataset.daily_max()] == [
+        row[2] for row in rows]
+    assert [value for _, value in dataset.hours_over_limit()] == [
+        row[3] for row in rows]
+    assert dataset.exceedance_days() == [
+        (date, value) for date, value in dataset.daily_mean()
+        if value > 35.0]
+    hourly = dataset.hourly("ozone")
+    want = bench.synthetic_hours(Eleven.date_to_ordinal("2021-01-20"),
+                                 24 * len(rows), "ozone")
+    assert len(hourly) == len(want)
+    assert all((math.isnan(got) and value is None) or got == value
+               for got, value in zip(hourly, want))
+
+
+def test_month_chunks_are_shared_between_windows(air_quality, server,
+                                                 zip_code):
+    Eleven.HistoricalAirQuality(zip_code, "2021-01-20", "2021-03-05")
+    assert air_quality.stats()["entries"] == 3
+    requests = server.requests
+    again = Eleven.HistoricalAirQuality(zip_code, "2021-02-03",
+                                        "2021-02-10", pollutants=(
+                                            "pm2_5", "pm10", "ozone"))
+    assert server.requests == requests
+    assert len(again.daily_mean()) == 8
+
+
+def test_month_chunks():
+    chunks = Eleven.HistoricalAirQuality._month_chunks(
+        Eleven.date_to_ordinal("2019-12-15"),
+        Eleven.date_to_ordinal("2020-02-03"))
+    assert [(Eleven.ordinal_to_date(first), Eleven.ordinal_to_date(last))
+            for first, last in chunks] == [
+        ("2019-12-01", "2019-12-31"), ("2020-01-01", "2020-01-31"),
+        ("2020-02-01", "2020-02-29")]
+
+
+def test_hourly_needs_keep_hourly(air_quality, zip_code):
+    dataset = Eleven.HistoricalAirQuality(zip_code, "2021-01-01",
+                                          "2021-01-02")
+    with pytest.raises(LookupError):
+        dataset.hourly()
+    with pytest.raises(LookupError):
+        dataset.daily_mean("carbon_monoxide")
+
+
+def test_average_of_empty_window_is_nan(air_quality, zip_code, monkeypatch):
+    monkeypatch.setattr(Eleven.HistoricalAirQuality, "_fetch_hours",
+                        lambda self, start, end: (None, {}))
+    dataset = Eleven.HistoricalAirQuality(zip_code, "2021-01-01",
+                                          "2021-01-05")
+    assert math.isnan(dataset.average())
@@ -0,0 +1,56 @@
+"""ArchiveBatcher merges requests and splits responses per location."""
+
+
+from concurrent.futures import ThreadPoolExecutor
+
+import Eleven
+import bench
+
+
+def test_batches_concurrent_loads(archive, cache):
+    zip_codes = [f"t1{row:03d}" for row in range(12)]
+    for row, zip_code in enumerate(zip_codes):
+        Eleven.zip_lookup_cache.store(zip_code, (30 + row, -100.0, zip_code))
+    batcher = Eleven.ArchiveBatcher(batch_size=5, window=0.2)
+    previous = Eleven.set_archive_batcher(batcher)
+    requests = archive.requests
+    try:
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            datasets = list(pool.map(
+                lambda zip_code: Eleven.HistoricalTemps(
+                    zip_code, "2001-01-01", "2001-01-31"), zip_codes))
+    finally:
+        Eleven.set_archive_batcher(previous)
+    assert batcher.calls == archive.requests - requests == 3
+    first_day = Eleven.date_to_ordinal("2001-01-01")
+    for row, dataset in enumerate(datasets):
+        assert dataset.column(Eleven.temp_variable).tolist() == (
+            bench.synthetic_temps(first_day, 31, 30 + row).tolist())
+    assert cache.stats()["entries"] == 12
+    again = Eleven.HistoricalTemps(zip_codes[4], "2001-01-01", "2001-01-31")
+    assert again.column(Eleven.temp_variable).tolist() == (
+        datasets[4].column(Eleven.temp_variable).tolist())
+    assert archive.requests - requests == 3
+
+
+def test_failed_batch_fails_every_member(cache):
+    with bench.FakeArchiveServer(error_rate=1.0) as failing:
+        client = Eleven.ArchiveClient(failing.url, retries=0)
+        batcher = Eleven.ArchiveBatcher(client, batch_size=2, window=0.2)
+        parameters = [{"latitude": lat, "longitude": -100.0,
+                       "start_date": "2001-01-01",
+                       "end_date": "2001-01-31",
+                       "daily": Eleven.temp_variable,
+                       "timezone": "America/Los_Angeles"}
+                      for lat in (30.0, 31.0)]
+        errors = []
+
+        def fetch(one):
+            try:
+                batcher.fetch(one)
+            except LookupError as error:
+                errors.append(error)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(fetch, parameters))
+        client.close()
+    assert len(errors) == 2 and batcher.calls == 1
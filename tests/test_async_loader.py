@@ -0,0 +1,36 @@
+"""load_datasets_async against the stand-in archive."""
+
+
+import asyncio
+import math
+
+import Eleven
+
+
+async def collect(zip_codes, **options):
+    """Gather everything load_datasets_async yields, in arrival order."""
+    return [result async for result in Eleven.load_datasets_async(
+        zip_codes, "2001-01-01", "2001-12-31", **options)]
+
+
+def test_matches_synchronous_loads(archive):
+    zip_codes = [f"t8{row:03d}" for row in range(10)]
+    for row, zip_code in enumerate(zip_codes):
+        Eleven.zip_lookup_cache.store(zip_code, (20 + row, -90.0, zip_code))
+    results = asyncio.run(collect(zip_codes + zip_codes[:3],
+                                  concurrency=4))
+    assert sorted(zip_code for zip_code, _, _ in results) == zip_codes
+    for zip_code, dataset, error in results:
+        assert error is None
+        expected = Eleven.HistoricalTemps(zip_code, "2001-01-01",
+                                          "2001-12-31")
+        assert dataset.daily_values() == expected.daily_values()
+
+
+def test_bad_location_is_reported_not_raised(archive, zip_code):
+    Eleven.zip_lookup_cache.store("t8bad", (math.nan, math.nan, math.nan))
+    results = dict((zip_code, (dataset, error)) for zip_code, dataset, error
+                   in asyncio.run(collect([zip_code, "t8bad"])))
+    assert results[zip_code][1] is None
+    assert results["t8bad"][0] is None
+    assert results["t8bad"][1].startswith("LookupError: ")
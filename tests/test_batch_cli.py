@@ -0,0 +1,113 @@
+"""The batch command line: subcommands, output formats and errors."""
+
+
+import csv
+import gc
+import io
+import json
+import math
+import weakref
+
+import pytest
+
+import Eleven
+
+
+def strict(text):
+    """Parse JSON Lines, rejecting NaN and Infinity like strict parsers."""
+    def refuse(constant):
+        raise ValueError(constant)
+    return [json.loads(line, parse_constant=refuse)
+            for line in text.splitlines()]
+
+
+def run(*argv):
+    """Run one batch command, returning (exit code, stdout text)."""
+    out = io.StringIO()
+    code = Eleven.run_batch(Eleven.build_parser().parse_args(argv), out)
+    return code, out.getvalue()
+
+
+@pytest.fixture
+def zip_codes(archive):
+    """Register three made-up zip codes for the stand-in archive."""
+    codes = [f"t2{row:03d}" for row in range(3)]
+    for row, code in enumerate(codes):
+        Eleven.zip_lookup_cache.store(code, (30 + 5 * row, -100.0,
+                                             f"Town {row}"))
+    return codes
+
+
+def test_average_over_several_ranges(zip_codes):
+    code, out = run("average", *zip_codes, "--range",
+                    "2001-01-01:2001-01-31", "--range",
+                    "2002-06-01:2002-06-30")
+    rows = strict(out)
+    assert code == 0 and len(rows) == 6
+    for row in rows:
+        dataset = Eleven.HistoricalTemps(row["zip_code"], row["start"],
+                                         row["end"])
+        assert row["average"] == pytest.approx(dataset.average_temp())
+
+
+def test_top_and_extreme_days_as_csv(zip_codes):
+    code, out = run("top-days", zip_codes[0], "--start", "2001-01-01",
+                    "--end", "2001-12-31", "--num-days", "3", "--coldest",
+                    "--format", "csv")
+    rows = list(csv.DictReader(io.StringIO(out)))
+    dataset = Eleven.HistoricalTemps(zip_codes[0], "2001-01-01",
+                                     "2001-12-31")
+    assert code == 0
+    assert [(row["date"], float(row["temp"])) for row in rows] == (
+        dataset.bottom_x_days(3))
+    code, out = run("extreme-days", zip_codes[0], "--start", "2001-01-01",
+                    "--end", "2001-12-31", "--threshold", "30")
+    assert [(row["date"], row["temp"]) for row in strict(out)] == [
+        tuple(day) for day in dataset.extreme_days(30.0)]
+
+
+def test_compare_ranks_locations(zip_codes):
+    code, out = run("compare", *zip_codes, "--start", "2001-01-01",
+                    "--end", "2001-12-31", "--sort-by", "max", "--limit",
+                    "2")
+    rows = strict(out)
+    assert code == 0 and [row["rank"] for row in rows] == [1, 2]
+    assert rows[0]["max"] >= rows[1]["max"]
+
+
+def test_bad_zip_is_reported_and_fails_the_run(zip_codes, capsys):
+    Eleven.zip_lookup_cache.store("t2bad", (math.nan, math.nan, math.nan))
+    code, out = run("average", zip_codes[0], "t2bad", "--start",
+                    "2001-01-01", "--end", "2001-01-31")
+    assert code == 1
+    assert [row["zip_code"] for row in strict(out)] == [zip_codes[0]]
+    error = json.loads(capsys.readouterr().err)
+    assert error["zip_code"] == "t2bad" and "could not be found" in (
+        error["error"])
+
+
+@pytest.mark.parametrize("output_format", ["jsonl", "csv"])
+def test_nan_is_written_as_null(output_format):
+    out = io.StringIO()
+    writer = Eleven.RowWriter(out, output_format, ["zip_code", "average"])
+    writer.write({"zip_code": "1", "average": math.nan})
+    if output_format == "jsonl":
+        assert strict(out.getvalue()) == [{"zip_code": "1",
+                                           "average": None}]
+    else:
+        assert out.getvalue().splitlines()[1] == "1,"
+
+
+def test_finished_datasets_are_not_held(zip_codes, monkeypatch):
+    alive = []
+    rows = Eleven.dataset_rows
+
+    def tracked(args, dataset):
+        gc.collect()
+        assert [ref for ref in alive if ref() is not None] == []
+        alive.append(weakref.ref(dataset))
+        return rows(args, dataset)
+    monkeypatch.setattr(Eleven, "dataset_rows", tracked)
+    code, out = run("average", *zip_codes, "--start", "2001-01-01",
+                    "--end", "2001-01-31", "--workers", "1")
+    assert code == 0 and len(strict(out)) == 3
@@ -0,0 +1,80 @@
+"""Chunked fetching: aligned chunk edges, short windows, failures."""
+
+
+import pytest
+
+import Eleven
+import bench
+
+
+def dates(chunks):
+    """Turn (first, last) ordinals into date strings for readability."""
+    return [(Eleven.ordinal_to_date(first), Eleven.ordinal_to_date(last))
+            for first, last in chunks]
+
+
+def chunks(start, end):
+    """Return the chunk dates for a window."""
+    return dates(Eleven.HistoricalTemps._chunk_ranges(
+        Eleven.date_to_ordinal(start), Eleven.date_to_ordinal(end)))
+
+
+def test_chunks_break_on_aligned_years_without_widening():
+    assert chunks("2001-01-05", "2001-01-10") == [
+        ("2001-01-05", "2001-01-10")]
+    assert chunks("1985-03-01", "2012-07-04") == [
+        ("1985-03-01", "1989-12-31"), ("1990-01-01", "1999-12-31"),
+        ("2000-01-01", "2009-12-31"), ("2010-01-01", "2012-07-04")]
+
+
+@pytest.mark.parametrize("start, end", [("0001-01-01", "0001-12-31"),
+                                        ("0005-01-01", "0012-01-01"),
+                                        ("9995-06-01", "9999-12-31")])
+def test_chunks_at_the_ends_of_the_calendar(start, end):
+    found = chunks(start, end)
+    assert found[0][0] == start and found[-1][1] == end
+    for (_, last), (first, _) in zip(found, found[1:]):
+        assert Eleven.date_to_ordinal(last) + 1 == (
+            Eleven.date_to_ordinal(first))
+
+
+def test_short_window_only_fetches_its_days(archive, zip_code):
+    requests = archive.requests
+    dataset = Eleven.HistoricalTemps(zip_code, "2001-01-05", "2001-01-10")
+    assert archive.requests == requests + 1
+    assert sum(len(values) for _, values in
+               dataset._segments[Eleven.temp_variable]._segments) == 6
+
+
+def test_extreme_years_load(archive, zip_code):
+    dataset = Eleven.HistoricalTemps(zip_code, "2001-01-01", "2001-01-02")
+    dataset.set_range("9999-12-20", "9999-12-31")
+    assert dataset.daily_values()[-1][0] == "9999-12-31"
+    dataset.set_range("0005-01-01", "0005-01-03")
+    assert [date for date, _ in dataset.daily_values()] == [
+        "0005-01-01", "0005-01-02", "0005-01-03"]
+
+
+def test_interior_chunks_are_shared_and_gaps_fetched_once(archive, cache,
+                                                          zip_code):
+    dataset = Eleven.HistoricalTemps(zip_code, "1985-03-01", "2012-07-04")
+    requests = archive.requests
+    assert cache.stats()["entries"] == 4
+    other = Eleven.HistoricalTemps(zip_code, "1987-01-01", "2003-02-01")
+    assert archive.requests == requests + 2
+    dataset.set_range("1984-12-01", "2012-07-04")
+    assert archive.requests == requests + 3
+    assert other.daily_values()[0][0] == "1987-01-01"
+
+
+def test_failed_chunk_is_not_retried_on_top_of_the_client(cache, zip_code):
+    with bench.FakeArchiveServer(error_rate=1.0) as failing:
+        client = Eleven.ArchiveClient(failing.url, retries=1, backoff=0.01)
+        previous = Eleven.set_archive_client(client)
+        try:
+            with pytest.raises(LookupError):
+                Eleven.HistoricalTemps(zip_code, "2001-01-01", "2001-01-31")
+        finally:
+            Eleven.set_archive_client(previous)
+            client.close()
+        assert failing.requests == 2
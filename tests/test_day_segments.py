@@ -0,0 +1,58 @@
+"""DaySegments gap finding, merging and window slicing."""
+
+
+import math
+
+import Eleven
+
+
+def runs(segments):
+    """Return [(first, last)] for every segment held."""
+    return [(first, first + len(values) - 1)
+            for first, values in segments._segments]
+
+
+def test_missing_on_empty_and_partial():
+    segments = Eleven.DaySegments()
+    assert segments.missing(10, 20) == [(10, 20)]
+    segments.add(12, [1.0] * 3)
+    segments.add(18, [2.0] * 5)
+    assert segments.missing(10, 20) == [(10, 11), (15, 17)]
+    assert segments.missing(12, 14) == []
+    assert segments.missing(30, 31) == [(30, 31)]
+
+
+def test_add_merges_overlapping_and_touching_runs():
+    segments = Eleven.DaySegments()
+    segments.add(20, [2.0, 2.0])
+    segments.add(10, [1.0, 1.0])
+    assert runs(segments) == [(10, 11), (20, 21)]
+    segments.add(12, [3.0] * 8)
+    assert runs(segments) == [(10, 21)]
+    segments.add(5, [4.0] * 20)
+    assert runs(segments) == [(5, 24)]
+    assert segments.slice(5, 24).tolist() == [4.0] * 20
+
+
+def test_new_values_win_over_old():
+    segments = Eleven.DaySegments()
+    segments.add(0, [0.0] * 10)
+    segments.add(3, [1.0, 1.0])
+    assert segments.slice(0, 9).tolist() == [0.0] * 3 + [1.0] * 2 + [0.0] * 5
+
+
+def test_slice_inside_one_segment_is_a_view():
+    segments = Eleven.DaySegments()
+    segments.add(100, [float(day) for day in range(50)])
+    window = segments.slice(110, 114)
+    assert isinstance(window, memoryview) and window.readonly
+    assert window.tolist() == [10.0, 11.0, 12.0, 13.0, 14.0]
+
+
+def test_slice_across_gaps_fills_nan():
+    segments = Eleven.DaySegments()
+    segments.add(0, [1.0, 2.0])
+    segments.add(4, [5.0])
+    values = segments.slice(0, 5)
+    assert values[:2].tolist() == [1.0, 2.0] and values[4] == 5.0
+    assert all(math.isnan(values[day]) for day in (2, 3, 5))
@@ -0,0 +1,172 @@
+"""DailyColumnsDecoder against json.loads on archive-shaped bodies."""
+
+
+import json
+import math
+
+import pytest
+
+import Eleven
+import bench
+
+
+def decode(body, variables, chunk_size, block="daily"):
+    """Feed body to a decoder in chunk_size pieces and return it."""
+    decoder = Eleven.DailyColumnsDecoder(variables, block)
+    for pos in range(0, len(body), chunk_size):
+        decoder.feed(body[pos:pos + chunk_size])
+    decoder.close()
+    return decoder
+
+
+def expected(payload, variables, block="daily"):
+    """Return (first day, {variable: list}) the way json.loads sees it."""
+    daily = payload[block]
+    return (Eleven.date_to_ordinal(daily["time"][0][:10]),
+            {variable: [math.nan if value is None else value
+                        for value in daily[variable]]
+             for variable in variables})
+
+
+def same(left, right):
+    """Compare float lists treating NaN as equal to NaN."""
+    return len(left) == len(right) and all(
+        a == b or (math.isnan(a) and math.isnan(b))
+        for a, b in zip(left, right))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_matches_json_loads(chunk_size):
+    variables = ("temperature_2m_max", "precipitation_sum")
+    payload = bench.synthetic_payload("1999-12-01", "2000-03-31", variables)
+    payload["daily"]["precipitation_sum"][3] = None
+    payload["daily"]["temperature_2m_max"][-1] = -1.5e-3
+    body = json.dumps(payload).encode()
+    decoder = decode(body, variables, chunk_size)
+    first_day, columns = expected(payload, variables)
+    assert decoder.locations[0][0] == first_day
+    for variable in variables:
+        assert same(decoder.locations[0][1][variable], columns[variable])
+    assert len(decoder.locations) == 1
+
+
+def test_skips_lookalike_keys_and_escapes():
+    payload = {"note": "daily \"time\" [1, 2]: {x}",
+               "daily_units": {"time": "iso8601",
+                               "temperature_2m_max": "°C"},
+               "nested": {"daily": {"time": ["1900-01-01"],
+                                    "temperature_2m_max": [99.0]}},
+               "daily": {"time": ["2001-01-01", "2001-01-02"],
+                         "temperature_2m_max": [1.0, None]}}
+    body = json.dumps(payload, ensure_ascii=False).encode()
+    for chunk_size in (1, 3, len(body)):
+        decoder = decode(body, ["temperature_2m_max"], chunk_size)
+        first_day, columns = decoder.locations[0]
+        assert first_day == Eleven.date_to_ordinal("2001-01-01")
+        assert same(columns["temperature_2m_max"], [1.0, math.nan])
+
+
+def test_hourly_block():
+    payload = {"hourly": {"time": ["2020-05-01T00:00", "2020-05-01T01:00"],
+                          "pm2_5": [3.5, None]}}
+    decoder = decode(json.dumps(payload).encode(), ["pm2_5"], 5, "hourly")
+    first_day, columns = decoder.locations[0]
+    assert first_day == Eleven.date_to_ordinal("2020-05-01")
+    assert same(columns["pm2_5"], [3.5, math.nan])
+
+
+def test_multi_location_body():
+    payloads = [bench.synthetic_payload("2000-01-01", "2000-01-10",
+                                        lat=lat) for lat in (30.0, 31.0)]
+    decoder = decode(json.dumps(payloads).encode(),
+                     ["temperature_2m_max"], 11)
+    assert len(decoder.locations) == 2
+    for (first_day, columns), payload in zip(decoder.locations, payloads):
+        assert (first_day, columns["temperature_2m_max"].tolist()) == (
+            expected(payload, ["temperature_2m_max"])[0],
+            payload["daily"]["temperature_2m_max"])
+
+
+def test_missing_block_raises():
+    with pytest.raises(KeyError):
+        decode(b'{"error": true, "reason": "nope"}',
+               ["temperature_2m_max"], 4)
+
+
+@pytest.mark.parametrize("times, values", [(1, 3), (3, 1), (2, 0)])
+def test_dates_and_values_must_line_up(times, values):
+    payload = {"daily": {
+        "time": [Eleven.ordinal_to_date(730000 + day)
+                 for day in range(times)],
+        "temperature_2m_max": [1.0] * values}}
+    with pytest.raises(ValueError):
+        decode(json.dumps(payload).encode(), ["temperature_2m_max"], 9)
+
+
+def test_missing_variable_raises():
+    payload = {"daily": {"time": ["2001-01-01"],
+                         "temperature_2m_max": [1.0]}}
+    with pytest.raises(ValueError):
+        decode(json.dumps(payload).encode(),
+               ["temperature_2m_max", "precipitation_sum"], 9)
+
+
+class BadBodyClient:
+    """Answer every archive call with a 200 and a given body."""
+
+    def __init__(self, body):
+        self.body = body
+
+    def get(self, parameters, stream=False):
+        return BadBodyResponse(self.body)
+
+
+class BadBodyResponse:
+    """The bits of a requests response that _fetch_days touches."""
+
+    status_code = 200
+
+    def __init__(self, body):
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def iter_content(self, chunk_size):
+        return iter([self.body])
+
+
+@pytest.mark.parametrize("body", [
+    b'{"daily": {"time": ["2001-01-01"], "temperature_2m_max": [1, 2]}}',
+    b'{"daily": {"time": ["2001-01-01"], "temperature_2m_max": [1x]}}'])
+def test_unreadable_body_is_a_lookup_error(cache, zip_code, body):
+    previous = Eleven.set_archive_client(BadBodyClient(body))
+    try:
+        with pytest.raises(LookupError):
+            Eleven.HistoricalTemps(zip_code, "2001-01-01", "2001-01-01")
+    finally:
+        Eleven.set_archive_client(previous)
+    assert cache.stats()["entries"] == 0
+
+
+def test_unreadable_cache_entry_is_refetched(archive, cache, zip_code):
+    dataset = Eleven.HistoricalTemps(zip_code, "2001-01-01", "2001-01-05")
+    expected = dataset.daily_values()
+    (path, size, _), = cache.entries()
+    with open(path, "w", encoding="utf-8") as file:
+        file.write('{"daily": {"time": ["2001-01-01"], "temp')
+    requests = archive.requests
+    dataset.release_series()
+    assert dataset.daily_values() == expected
+    assert archive.requests == requests + 1
+    assert [entry[1] for entry in cache.entries()] == [size]
+
+
+def test_truncated_body_raises():
+    body = json.dumps(bench.synthetic_payload("2000-01-01",
+                                              "2000-01-10")).encode()
+    with pytest.raises((KeyError, ValueError)):
+        decode(body[:len(body) // 2] + b'"x', ["temperature_2m_max"], 8)
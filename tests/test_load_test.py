@@ -0,0 +1,13 @@
+"""run_load_test fetches exactly the span it reports."""
+
+
+import bench
+
+
+def test_serves_requested_years_only():
+    report = bench.run_load_test(datasets=5, rate=50, concurrency=4,
+                                 years=2, latency=0.0)
+    assert report["succeeded"] == 5 and report["failed"] == 0
+    assert report["days_per_dataset"] == int(2 * 365.25)
+    assert report["server_days"] == 5 * report["days_per_dataset"]
+    assert report["server_requests"] >= 5
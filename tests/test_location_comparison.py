@@ -0,0 +1,78 @@
+"""LocationComparison statistics and ranking against per-dataset answers."""
+
+
+import math
+from array import array
+
+import pytest
+
+import Eleven
+import bench
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def datasets():
+    """Three synthetic locations with different spans, one with gaps."""
+    found = [bench.synthetic_dataset(2, f"c{row}", 30.0 + 7 * row,
+                                     start=start)
+             for row, start in enumerate(("2000-01-01", "2000-07-01",
+                                          "2001-03-01"))]
+    found[1]._columns[Eleven.temp_variable][10:40] = (
+        array("d", [math.nan]) * 30)
+    return found
+
+
+def test_statistics_match_each_dataset(datasets):
+    stats = Eleven.LocationComparison(datasets).statistics(30.0, 75.0)
+    for row, dataset in enumerate(datasets):
+        valid = [temp for _, temp in dataset.daily_values()
+                 if not math.isnan(temp)]
+        assert stats["average"][row] == pytest.approx(dataset.average_temp())
+        assert stats["max"][row] == dataset.max_temp()
+        assert stats["min"][row] == dataset.min_temp()
+        assert stats["days"][row] == len(valid)
+        assert stats["days_above"][row] == dataset.count_days_above(
+            [30.0])[0]
+        assert stats["percentile"][row] == pytest.approx(
+            np.percentile(valid, 75.0))
+
+
+def test_window_clips_every_location(datasets):
+    comparison = Eleven.LocationComparison(datasets, "2001-03-01",
+                                           "2001-03-31")
+    assert comparison.temps.shape == (3, 31)
+    stats = comparison.statistics()
+    for row, dataset in enumerate(datasets):
+        assert stats["average"][row] == pytest.approx(
+            dataset.average_temp("2001-03-01", "2001-03-31"))
+
+
+def test_location_without_readings_sorts_last(datasets):
+    comparison = Eleven.LocationComparison(datasets, "2000-01-01",
+                                           "2000-03-31")
+    table = comparison.table()
+    assert table[0]["zip_code"] == "c0"
+    assert all(row["days"] == 0 and math.isnan(row["average"])
+               for row in table[1:])
+
+
+def test_table_sorts_and_hottest_cuts(datasets):
+    comparison = Eleven.LocationComparison(datasets)
+    for sort_by in ("average", "max", "days_above"):
+        values = [row[sort_by] for row in comparison.table(sort_by=sort_by)]
+        assert values == sorted(values, reverse=True)
+    ascending = comparison.table(sort_by="min", descending=False)
+    assert [row["min"] for row in ascending] == sorted(
+        row["min"] for row in ascending)
+    assert comparison.hottest(2) == comparison.table()[:2]
+    with pytest.raises(LookupError):
+        comparison.table(sort_by="humidity")
+
+
+def test_bad_input_is_a_lookup_error(datasets):
+    with pytest.raises(LookupError):
+        Eleven.LocationComparison([])
+    with pytest.raises(LookupError):
+        Eleven.LocationComparison(datasets, "2001-01-02", "2001-01-01")
@@ -0,0 +1,74 @@
+"""Per-phase metrics, callbacks and Prometheus/JSON export."""
+
+
+import json
+
+import pytest
+
+import Eleven
+
+
+@pytest.fixture
+def recording():
+    """Enable the module metrics for one test, then reset them."""
+    Eleven.metrics.reset()
+    Eleven.metrics.enable()
+    yield Eleven.metrics
+    Eleven.metrics.disable()
+    Eleven.metrics.reset()
+
+
+def test_disabled_records_nothing():
+    metrics = Eleven.Metrics()
+    with metrics.phase("http"):
+        pass
+    assert metrics.snapshot() == {"phases": {}}
+
+
+def test_counts_errors_and_buckets():
+    metrics = Eleven.Metrics(buckets=(0.1, 1.0))
+    samples = []
+    metrics.enable(lambda *sample: samples.append(sample))
+    metrics.record("decode", 0.05)
+    metrics.record("decode", 0.5)
+    metrics.record("decode", 2.0, ok=False)
+    with pytest.raises(KeyError):
+        with metrics.phase("geocode"):
+            raise KeyError("nowhere")
+    phases = metrics.snapshot()["phases"]
+    decode = phases["decode"]
+    assert (decode["count"], decode["errors"]) == (3, 1)
+    assert decode["sum"] == pytest.approx(2.55)
+    assert decode["buckets"] == {"0.1": 1, "1.0": 2, "+Inf": 3}
+    assert phases["geocode"]["errors"] == 1
+    assert [name for name, _, _ in samples] == ["decode"] * 3 + ["geocode"]
+    assert samples[2][2] is False and samples[3][2] is False
+    metrics.disable()
+    metrics.record("decode", 0.05)
+    assert metrics.snapshot()["phases"]["decode"]["count"] == 4
+    metrics.reset()
+    assert metrics.snapshot() == {"phases": {}}
+
+
+def test_timed_phases_during_a_load(recording, archive, zip_code):
+    Eleven.HistoricalTemps(zip_code, "2001-01-01", "2001-03-31")
+    phases = recording.snapshot()["phases"]
+    for name in ("load", "http", "decode"):
+        assert phases[name]["count"] >= 1 and phases[name]["errors"] == 0
+
+
+def test_writes_prometheus_and_json(tmp_path):
+    metrics = Eleven.Metrics(buckets=(0.1,))
+    metrics.enable()
+    metrics.record("http", 0.05)
+    metrics.record("http", 0.2, ok=False)
+    text = open(metrics.write(str(tmp_path / "eleven.prom"))).read()
+    assert 'eleven_phase_seconds_bucket{phase="http",le="0.1"} 1' in text
+    assert 'eleven_phase_seconds_bucket{phase="http",le="+Inf"} 2' in text
+    assert 'eleven_phase_seconds_count{phase="http"} 2' in text
+    assert 'eleven_phase_errors_total{phase="http"} 1' in text
+    assert "# TYPE eleven_phase_seconds histogram" in text
+    with open(metrics.write(str(tmp_path / "eleven.json"))) as file:
+        assert json.load(file) == metrics.snapshot()
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "eleven.json", "eleven.prom"]
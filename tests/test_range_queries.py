@@ -0,0 +1,65 @@
+"""Prefix-sum and block min/max range queries against a plain scan."""
+
+
+import math
+import random
+
+import pytest
+
+import Eleven
+
+
+def reference(values, lo, hi):
+    """Return (min, max, mean, sum) of the readings in values[lo:hi]."""
+    valid = [value for value in values[lo:hi] if not math.isnan(value)]
+    if not valid:
+        return math.nan, math.nan, math.nan, 0.0
+    return min(valid), max(valid), sum(valid) / len(valid), sum(valid)
+
+
+def test_range_queries_match_a_scan(gappy):
+    dataset, values = gappy
+    rng = random.Random(3)
+    first_day = dataset._first_day
+    for _ in range(500):
+        lo = rng.randrange(-30, len(values) + 30)
+        hi = rng.randrange(lo, len(values) + 60)
+        start = Eleven.ordinal_to_date(first_day + lo)
+        end = Eleven.ordinal_to_date(first_day + hi - 1)
+        clamp_lo = min(max(lo, 0), len(values))
+        clamp_hi = max(min(hi, len(values)), clamp_lo)
+        low, high, mean, total = reference(values, clamp_lo, clamp_hi)
+        got = (dataset.min_temp(start, end), dataset.max_temp(start, end),
+               dataset.average_temp(start, end))
+        for value, want in zip(got, (low, high, mean)):
+            assert (math.isnan(value) and math.isnan(want)) or (
+                value == pytest.approx(want))
+        assert dataset.sum_temp(start, end) == pytest.approx(total)
+
+
+def test_whole_window_defaults(gappy):
+    dataset, values = gappy
+    low, high, mean, total = reference(values, 0, len(values))
+    assert (dataset.min_temp(), dataset.max_temp()) == (low, high)
+    assert dataset.average_temp() == pytest.approx(mean)
+    assert dataset.sum_temp() == pytest.approx(total)
+
+
+@pytest.mark.parametrize("start, end", [("1900-01-01", "1900-12-31"),
+                                        ("1992-09-27", "1992-10-05"),
+                                        ("1995-01-10", "1995-01-01")])
+def test_empty_windows_give_nan(gappy, start, end):
+    dataset, _ = gappy
+    assert math.isnan(dataset.average_temp(start, end))
+    assert math.isnan(dataset.min_temp(start, end))
+    assert math.isnan(dataset.max_temp(start, end))
+    assert dataset.sum_temp(start, end) == 0.0
+
+
+def test_block_tables_stay_small(gappy):
+    dataset, values = gappy
+    dataset.min_temp()
+    dataset.max_temp()
+    tables = sum(len(level) for kind in ("min", "max")
+                 for level in dataset._aggregates[kind])
+    assert tables < len(values) / 4
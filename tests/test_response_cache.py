@@ -0,0 +1,82 @@
+"""ResponseCache keys, LRU eviction, size tracking and purge."""
+
+
+import os
+import time
+
+import Eleven
+
+
+def parameters(lat, end="2000-12-31"):
+    """Return archive request parameters for a past window."""
+    return {"latitude": lat, "longitude": -122.0, "start_date": "2000-01-01",
+            "end_date": end, "daily": "temperature_2m_max",
+            "timezone": "America/Los_Angeles"}
+
+
+def test_round_trip_and_counters(tmp_path):
+    cache = Eleven.ResponseCache(str(tmp_path))
+    assert cache.get(parameters(1.0)) is None
+    cache.put(parameters(1.0), '{"daily": {}}')
+    assert cache.get(parameters(1.00001)) == '{"daily": {}}'
+    with cache.open_entry(parameters(1.0)) as entry:
+        assert entry.read() == b'{"daily": {}}'
+    assert cache.get(parameters(2.0)) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 1)
+
+
+def test_recent_windows_are_not_cached(tmp_path):
+    cache = Eleven.ResponseCache(str(tmp_path))
+    cache.put(parameters(1.0, end=Eleven.ordinal_to_date(
+        Eleven.date_to_ordinal(time.strftime("%Y-%m-%d")) - 1)), "{}")
+    assert cache.stats()["entries"] == 0
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = Eleven.ResponseCache(str(tmp_path), max_bytes=1000,
+                                 low_water=0.5)
+    for lat in range(9):
+        cache.put(parameters(float(lat)), "x" * 100)
+        path = cache._path(parameters(float(lat)))
+        os.utime(path, (lat, lat))
+    os.utime(cache._path(parameters(0.0)), (100, 100))
+    cache.put(parameters(9.0), "x" * 100)
+    cache.put(parameters(10.0), "x" * 100)
+    kept = {lat for lat in range(11)
+            if os.path.exists(cache._path(parameters(float(lat))))}
+    assert kept == {0, 7, 8, 9, 10}
+    assert cache.stats()["bytes"] == cache._bytes == 500
+
+
+def test_total_stays_in_step_with_overwrites(tmp_path):
+    cache = Eleven.ResponseCache(str(tmp_path), rescan_every=1000)
+    cache.put(parameters(1.0), "x" * 10)
+    cache.evict()
+    cache.put(parameters(1.0), "x" * 30)
+    cache.put(parameters(2.0), "x" * 5)
+    assert cache._bytes == cache.stats()["bytes"] == 35
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path):
+    cache = Eleven.ResponseCache(str(tmp_path))
+    try:
+        cache.put(parameters(1.0), b"not text")
+    except TypeError:
+        pass
+    assert os.listdir(tmp_path) == []
+
+
+def test_tee_writes_entry_once_consumed(tmp_path):
+    cache = Eleven.ResponseCache(str(tmp_path))
+    chunks = list(cache.tee(parameters(1.0), iter([b"ab", b"cd"])))
+    assert chunks == [b"ab", b"cd"]
+    assert cache.get(parameters(1.0)) == "abcd"
+
+
+def test_purge(tmp_path):
+    cache = Eleven.ResponseCache(str(tmp_path))
+    for lat in range(3):
+        cache.put(parameters(float(lat)), "{}")
+    assert cache.purge() == 3
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,39 @@
+"""HistoricalTemps.set_range swaps the window in only when it loads."""
+
+
+import pytest
+
+import Eleven
+
+
+@pytest.fixture
+def dataset(archive, zip_code):
+    """A one-month dataset loaded from the stand-in archive."""
+    return Eleven.HistoricalTemps(zip_code, "2001-02-03", "2001-03-04")
+
+
+def test_swaps_window_in(dataset):
+    dataset.set_range("2001-06-01", "2001-06-30")
+    assert (dataset.start, dataset.end) == ("2001-06-01", "2001-06-30")
+    assert dataset.daily_values()[0][0] == "2001-06-01"
+    assert len(dataset.column(Eleven.temp_variable)) == 30
+
+
+@pytest.mark.parametrize("start, end", [("2001-03-04", "2001-02-03"),
+                                        ("2001-02-30", "2001-03-04"),
+                                        ("yesterday", "2001-03-04")])
+def test_bad_dates_keep_old_window(dataset, start, end):
+    with pytest.raises(LookupError):
+        dataset.set_range(start, end)
+    assert (dataset.start, dataset.end) == ("2001-02-03", "2001-03-04")
+    assert dataset.daily_values()[0][0] == "2001-02-03"
+
+
+def test_unexpected_errors_keep_old_window(dataset, monkeypatch):
+    def fail(chunks):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(dataset, "_fetch_chunks", fail)
+    with pytest.raises(RuntimeError):
+        dataset.set_range("1990-01-01", "1990-12-31")
+    assert (dataset.start, dataset.end) == ("2001-02-03", "2001-03-04")
+    assert len(dataset.column(Eleven.temp_variable)) == 30
@@ -0,0 +1,29 @@
+"""extreme_days and count_days_above against a plain scan."""
+
+
+import pytest
+
+import Eleven
+
+
+@pytest.mark.parametrize("threshold", [-100.0, 20.0, 30.0, 31.4, 100.0])
+def test_extreme_days_match_a_scan(gappy, readings, threshold):
+    dataset, _ = gappy
+    assert dataset.extreme_days(threshold) == [
+        row for row in readings if row[1] > threshold]
+
+
+def test_count_days_above_matches_a_scan(gappy, readings):
+    dataset, _ = gappy
+    thresholds = [10.0, 20.0, 25.5, 30.0, 40.0]
+    assert dataset.count_days_above(thresholds) == [
+        sum(row[1] > threshold for row in readings)
+        for threshold in thresholds]
+
+
+def test_index_is_rebuilt_for_a_new_window(archive, zip_code):
+    dataset = Eleven.HistoricalTemps(zip_code, "2001-01-01", "2001-12-31")
+    everything = dataset.extreme_days(-100.0)
+    dataset.set_range("2001-06-01", "2001-06-30")
+    assert dataset.extreme_days(-100.0) == everything[151:181]
+    assert dataset.count_days_above([-100.0]) == [30]
@@ -0,0 +1,10 @@
+"""Keep the cold start of Eleven.py under its budget."""
+
+
+import Eleven
+
+
+def test_cold_start_within_budget():
+    report = Eleven.check_startup()
+    assert report["heavy_modules"] == [], report
+    assert report["ok"], report
@@ -0,0 +1,48 @@
+"""top_x_days / bottom_x_days on both the heap and the index paths."""
+
+
+from array import array
+
+import pytest
+
+import bench
+
+
+def ranked(readings, num_days, coldest=False):
+    """Rank readings by temp, ties in date order, like the old sort."""
+    return sorted(readings, key=lambda row: row[1] if coldest
+                  else -row[1])[:num_days]
+
+
+@pytest.mark.parametrize("num_days", [0, 1, 10, 250])
+def test_heap_and_index_agree_with_a_sort(gappy, readings, num_days):
+    dataset, _ = gappy
+    hottest = dataset.top_x_days(num_days)
+    coldest = dataset.bottom_x_days(num_days)
+    assert hottest == ranked(readings, num_days)
+    assert coldest == ranked(readings, num_days, coldest=True)
+    dataset._sorted()
+    assert dataset.top_x_days(num_days) == hottest
+    assert dataset.bottom_x_days(num_days) == coldest
+
+
+def test_ties_keep_date_order():
+    dataset = bench.synthetic_dataset(1, start="2000-01-01")
+    dataset._columns[bench.temp_variable][:] = (
+        array("d", [5.0]) * len(dataset._temps))
+    dates = [date for date, _ in dataset.daily_values()]
+    for warm in (False, True):
+        if warm:
+            dataset._sorted()
+        assert [date for date, _ in dataset.top_x_days(3)] == dates[:3]
+        assert [date for date, _ in dataset.bottom_x_days(3)] == dates[:3]
+
+
+def test_benchmarks_compare_against_the_old_sort():
+    names = {name for name, params, _ in bench.benchmark_cases(quick=True)
+             if params == {"years": 1}}
+    assert {"top_x_days_sort", "top_x_days_heap",
+            "top_x_days_index"} <= names
+    sort = bench.bench_top_sort(1, 5)
+    assert [temp for _, temp in sort()] == [
+        temp for _, temp in bench.synthetic_dataset(1).top_x_days(5)]
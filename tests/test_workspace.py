@@ -0,0 +1,93 @@
+"""Workspace LRU order, memory budget and transparent reloads."""
+
+
+import io
+from contextlib import redirect_stdout
+
+import pytest
+
+import Eleven
+
+
+@pytest.fixture
+def zip_codes():
+    """Register six made-up zip codes at different latitudes."""
+    codes = [f"t7{row:03d}" for row in range(6)]
+    for row, code in enumerate(codes):
+        Eleven.zip_lookup_cache.store(code, (30 + row, -100.0, f"Town {row}"))
+    return codes
+
+
+def fill(workspace, zip_codes):
+    """Add a one-year dataset per zip code to the workspace."""
+    for code in zip_codes:
+        workspace.add(code, Eleven.HistoricalTemps(code, "2001-01-01",
+                                                   "2001-12-31"))
+
+
+def held(workspace):
+    """Return the total series bytes the workspace holds."""
+    return sum(workspace.memory_usage().values())
+
+
+def test_budget_releases_least_recently_used(archive, zip_codes):
+    workspace = Eleven.Workspace(memory_budget=10_000)
+    fill(workspace, zip_codes)
+    assert held(workspace) <= 10_000
+    assert workspace.peek(zip_codes[-1]).is_loaded
+    assert not workspace.peek(zip_codes[0]).is_loaded
+    assert workspace.names() == zip_codes
+
+
+def test_released_series_reload_from_cache(archive, zip_codes):
+    workspace = Eleven.Workspace(memory_budget=10_000)
+    fill(workspace, zip_codes)
+    expected = Eleven.HistoricalTemps(zip_codes[0], "2001-01-01",
+                                      "2001-12-31").average_temp()
+    requests = archive.requests
+    assert workspace.get(zip_codes[0]).average_temp() == expected
+    assert archive.requests == requests
+    assert held(workspace) <= 10_000
+    assert list(workspace._datasets)[-1] == zip_codes[0]
+
+
+def test_peek_and_listing_leave_lru_order_alone(archive, zip_codes):
+    workspace = Eleven.Workspace(memory_budget=10_000)
+    fill(workspace, zip_codes)
+    order = list(workspace._datasets)
+    usage = workspace.memory_usage()
+    with redirect_stdout(io.StringIO()):
+        Eleven.print_workspace(workspace)
+    assert workspace.peek(zip_codes[0]).loc_name == "Town 0"
+    assert list(workspace._datasets) == order
+    assert workspace.memory_usage() == usage
+
+
+def test_compare_stays_within_budget(archive, zip_codes):
+    unlimited = Eleven.Workspace()
+    fill(unlimited, zip_codes)
+    expected = unlimited.compare().table()
+    workspace = Eleven.Workspace(memory_budget=10_000)
+    fill(workspace, zip_codes)
+    assert workspace.compare().table() == expected
+    assert held(workspace) <= 10_000
+
+
+def test_comparing_averages_stays_within_budget(archive, zip_codes):
+    workspace = Eleven.Workspace(memory_budget=10_000)
+    fill(workspace, zip_codes)
+    with redirect_stdout(io.StringIO()) as out:
+        Eleven.compare_average_temps(*workspace.datasets())
+    assert out.getvalue().count("average maximum temperature") == 6
+    assert held(workspace) <= 10_000
+
+
+def test_remove_and_replace(archive, zip_codes):
+    workspace = Eleven.Workspace()
+    fill(workspace, zip_codes[:2])
+    removed = workspace.remove(zip_codes[0])
+    assert removed.on_grow is None and zip_codes[0] not in workspace
+    assert workspace.remove("nope") is None
+    old = workspace.peek(zip_codes[1])
+    fill(workspace, zip_codes[1:2])
+    assert old.on_grow is None and len(workspace) == 1
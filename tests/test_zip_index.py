@@ -0,0 +1,47 @@
+"""ZipIndex build and lookup against a tiny pgeocode-shaped table."""
+
+
+import math
+
+import pytest
+
+import Eleven
+
+
+class Geocoder:
+    """Stand in for pgeocode.Nominatim with a three-row table."""
+
+    def __init__(self):
+        pandas = pytest.importorskip("pandas")
+        self._data_frame = pandas.DataFrame({
+            "postal_code": ["01001", "90210", "99999"],
+            "latitude": [42.06, 34.09, math.nan],
+            "longitude": [-72.61, -118.41, 0.0],
+            "place_name": ["Agawam", "Beverly Hills", "Nowhere"]})
+
+
+@pytest.fixture
+def index(tmp_path):
+    """Build an index file from the stand-in table and open it."""
+    return Eleven.ZipIndex(Eleven.ZipIndex.build(str(tmp_path / "us.idx"),
+                                                 Geocoder()))
+
+
+def test_lookup(index):
+    assert len(index) == 2
+    lat, lon, name = index.lookup(" 90210 ")
+    assert (lat, lon, name) == (pytest.approx(34.09), pytest.approx(-118.41),
+                                "Beverly Hills")
+
+
+@pytest.mark.parametrize("zip_code", ["1001", "001001", "99999", "9021a",
+                                      "", "٠١٠٠١"])
+def test_unknown_or_malformed_codes_are_nan(index, zip_code):
+    assert all(math.isnan(value) for value in index.lookup(zip_code))
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "bogus.idx"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        Eleven.ZipIndex(str(path))